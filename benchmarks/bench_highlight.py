@@ -0,0 +1,59 @@
+"""
+Time taken to color a secret value for display, using the built-in
+colorizer, an external filter kept running, and an external command
+spawned on a temporary file for each value.
+
+    python benchmarks/bench_highlight.py [external filter]
+
+The filter defaults to "jq -C --unbuffered ."; external variants are
+skipped when it's not available.
+"""
+import os
+import sys
+
+# Run from a checkout, where vaultbrowser is not installed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vaultbrowser import highlight
+import shutil
+import shlex
+import time
+
+ROUNDS = 200
+
+SECRET = {
+    "username": "svc-payments",
+    "password": "s3cr3t-p4ssw0rd",
+    "port": 5432,
+    "replicas": ["db-0.internal", "db-1.internal", "db-2.internal"],
+    "tls": {"enabled": True, "ca": "-----BEGIN CERTIFICATE-----\n" + "A" * 1024},
+    "options": {f"option_{i}": i for i in range(50)},
+}
+
+
+def measure(name, colorize):
+    colorize(SECRET)
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        colorize(SECRET)
+    elapsed = (time.perf_counter() - started) / ROUNDS
+    print(f"{name:<24} {elapsed * 1000:8.3f}ms per value")
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "jq -C --unbuffered ."
+    measure("built-in", highlight.colorize)
+    if shutil.which(shlex.split(command)[0]):
+        coprocess = highlight.CoprocessHighlighter(command)
+        measure("co-process", coprocess.highlight)
+        coprocess.close()
+        measure(
+            "process per value",
+            highlight.FileHighlighter(f"cat {{file}}|{command}").highlight,
+        )
+    else:
+        print(f"{command} not found, external highlighters skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Memory footprint and listing time of the vault tree model.
+
+Builds a tree of teams/*/env/*/svc/* with about 500k nodes, feeding
+listings the same way background listings are applied, then prints the
+time spent listing and computing paths, and the memory held by the
+tree and by the search index.
+
+    python benchmarks/bench_nodes.py [node count]
+"""
+import os
+import sys
+
+# Run from a checkout, where vaultbrowser is not installed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vaultbrowser.vault.listmodel import VaultListModel, Node
+from vaultbrowser.vault.index import PathIndex
+import tracemalloc
+import time
+
+
+def _unbounded_model():
+    model = VaultListModel()
+    # Evicting would drop the tree while it's being built
+    model.node_budget = 0
+    return model
+
+
+def build_tree(model, node_count):
+    root = Node(model, None, "")
+    model._root = model._current = root
+    model._index = PathIndex()
+    leaves_per_service = 50
+    services = max(1, node_count // (leaves_per_service + 1))
+    teams = max(1, int(services ** (1 / 3)))
+    envs = max(1, teams)
+    services_per_env = max(1, services // (teams * envs))
+
+    root._on_loaded(["teams/"])
+    (teams_node,) = root.children
+    teams_node._on_loaded([f"team{i}/" for i in range(teams)])
+    for team in teams_node.children:
+        team._on_loaded(["env/"])
+        team.children[0]._on_loaded([f"env{i}/" for i in range(envs)])
+        for env in team.children[0].children:
+            env._on_loaded(["svc/"])
+            svc = env.children[0]
+            svc._on_loaded([f"svc{i}/" for i in range(services_per_env)])
+            for service in svc.children:
+                service._on_loaded([f"key-{i}" for i in range(leaves_per_service)])
+    return root
+
+
+def count_nodes(node):
+    return 1 + sum(count_nodes(c) for c in node._children or [])
+
+
+def all_paths(node):
+    yield node.path
+    for child in node._children or []:
+        yield from all_paths(child)
+
+
+def main():
+    node_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+
+    started = time.perf_counter()
+    root = build_tree(_unbounded_model(), node_count)
+    listing_time = time.perf_counter() - started
+    nodes = count_nodes(root)
+
+    started = time.perf_counter()
+    for _ in all_paths(root):
+        pass
+    cold_paths_time = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in all_paths(root):
+        pass
+    warm_paths_time = time.perf_counter() - started
+    del root
+
+    model = _unbounded_model()
+    tracemalloc.start()
+    # Kept alive by the model
+    build_tree(model, node_count)
+    total_memory, _ = tracemalloc.get_traced_memory()
+    model._index = None
+    tree_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"nodes:          {nodes}")
+    print(
+        f"listing time:   {listing_time:.2f}s "
+        f"({listing_time / nodes * 1e6:.1f}us/node)"
+    )
+    print(
+        f"tree memory:    {tree_memory / 2**20:.1f}MiB "
+        f"({tree_memory / nodes:.0f}B/node)"
+    )
+    print(f"index memory:   {(total_memory - tree_memory) / 2**20:.1f}MiB")
+    print(f"all paths:      {cold_paths_time:.2f}s cold, {warm_paths_time:.2f}s cached")
+
+
+if __name__ == "__main__":
+    main()
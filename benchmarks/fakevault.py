@@ -0,0 +1,392 @@
+"""
+In-process stand-in for a vault server, serving synthetic trees.
+
+It implements the endpoints the handlers use: sys/mounts,
+sys/capabilities-self, key/value v1 and v2 list/read/write/delete, v2
+metadata, and identity listings and reads. Every mount holds the same
+synthetic tree, given as fan-outs per level: [1000] is a single folder
+of 1000 keys, [10, 10, 100] has 10 folders of 10 folders of 100 keys.
+Entries are generated on the fly, so trees of millions of keys take no
+memory until written or deleted.
+
+Run standalone to point vaultbrowser at it:
+
+    python benchmarks/fakevault.py --port 8200 --fanout 10,10,100 --latency 0.02
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import argparse
+import threading
+import random
+import json
+import time
+
+KV1_MOUNT = "kv1"
+KV2_MOUNT = "kv2"
+IDENTITY_MOUNT = "identity"
+
+
+class SyntheticTree:
+    """
+    Tree of folders and keys generated from fan-outs, with writes and
+    deletes kept apart.
+    """
+    def __init__(self, fanouts, value_size=64):
+        self._fanouts = fanouts
+        self._value_size = value_size
+        self._lock = threading.Lock()
+        self._written = {}
+        self._written_children = {}
+        self._deleted = set()
+        self._deleted_below = {}
+        self._versions = {}
+
+    @property
+    def size(self):
+        size = 1
+        for fanout in self._fanouts:
+            size *= fanout
+        return size
+
+    def _name(self, level, index):
+        if level == len(self._fanouts) - 1:
+            return f"key-{index}"
+        return f"dir{level}-{index}/"
+
+    def _generated(self, path):
+        """
+        Returns the depth of a generated path, None if there's no such path.
+        """
+        parts = [p for p in path.split("/") if p]
+        if len(parts) > len(self._fanouts):
+            return None
+        for level, part in enumerate(parts):
+            prefix = "key-" if level == len(self._fanouts) - 1 else f"dir{level}-"
+            if not part.startswith(prefix):
+                return None
+            try:
+                index = int(part[len(prefix) :])
+            except ValueError:
+                return None
+            if index >= self._fanouts[level]:
+                return None
+        return len(parts)
+
+    def _leaves_below(self, level):
+        count = 1
+        for fanout in self._fanouts[level:]:
+            count *= fanout
+        return count
+
+    def list(self, path):
+        path = path.strip("/")
+        with self._lock:
+            keys = []
+            level = self._generated(path)
+            if level is not None and level < len(self._fanouts):
+                prefix = path + "/" if path else ""
+                for i in range(self._fanouts[level]):
+                    name = self._name(level, i)
+                    child = prefix + name.rstrip("/")
+                    if name.endswith("/"):
+                        below = self._leaves_below(level + 1)
+                        if self._deleted_below.get(child, 0) < below:
+                            keys.append(name)
+                    elif child not in self._deleted:
+                        keys.append(name)
+            for name in sorted(self._written_children.get(path, ())):
+                if name not in keys:
+                    keys.append(name)
+            return keys or None
+
+    def read(self, path):
+        path = path.strip("/")
+        with self._lock:
+            if path in self._written:
+                return self._written[path]
+            if path in self._deleted or self._generated(path) != len(self._fanouts):
+                return None
+        return {
+            "name": path,
+            "value": ("x" * self._value_size),
+        }
+
+    def version(self, path):
+        return self._versions.get(path.strip("/"), 1)
+
+    def write(self, path, data):
+        path = path.strip("/")
+        with self._lock:
+            self._written[path] = data
+            self._deleted.discard(path)
+            self._versions[path] = self._versions.get(path, 1) + 1
+            parts = path.split("/")
+            for i in range(len(parts)):
+                parent = "/".join(parts[:i])
+                name = parts[i] + ("/" if i < len(parts) - 1 else "")
+                self._written_children.setdefault(parent, set()).add(name)
+
+    def delete(self, path):
+        path = path.strip("/")
+        with self._lock:
+            if self._written.pop(path, None) is not None:
+                parent, _, name = path.rpartition("/")
+                self._written_children.get(parent, set()).discard(name)
+            if (
+                self._generated(path) == len(self._fanouts)
+                and path not in self._deleted
+            ):
+                self._deleted.add(path)
+                parts = path.split("/")
+                for i in range(1, len(parts)):
+                    folder = "/".join(parts[:i])
+                    self._deleted_below[folder] = self._deleted_below.get(folder, 0) + 1
+
+
+class FakeVault:
+    """
+    Serves a kv v1 mount, a kv v2 mount and an identity mount, all backed
+    by synthetic trees. Every request waits latency seconds, and a
+    throttle_rate fraction of writes is answered with 429. Entries named
+    as one in denied, in any folder, are forbidden.
+    """
+    def __init__(
+        self,
+        fanouts=[10, 10, 100],
+        latency=0,
+        entities=1000,
+        port=0,
+        throttle_rate=0,
+        denied=(),
+    ):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.denied = set(denied)
+        self.throttled = 0
+        self.requests = 0
+        # Requests are handled by a thread each
+        self.lock = threading.Lock()
+        self.trees = {
+            KV1_MOUNT: SyntheticTree(fanouts),
+            KV2_MOUNT: SyntheticTree(fanouts),
+        }
+        self.entities = [f"entity-{i:08d}" for i in range(entities)]
+        vault = self
+
+        class Handler(_RequestHandler):
+            pass
+
+        Handler.vault = vault
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def allowed(self, path):
+        return path.rstrip("/").rpartition("/")[2] not in self.denied
+
+    def mounts(self):
+        return {
+            f"{KV1_MOUNT}/": {"type": "kv", "options": {"version": "1"}},
+            f"{KV2_MOUNT}/": {"type": "kv", "options": {"version": "2"}},
+            f"{IDENTITY_MOUNT}/": {"type": "identity", "options": None},
+        }
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    vault = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_LIST(self):
+        self._handle("LIST")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _handle(self, method):
+        vault = self.vault
+        with vault.lock:
+            vault.requests += 1
+        if vault.latency:
+            time.sleep(vault.latency)
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if method == "GET" and query.get("list", [""])[0].lower() == "true":
+            method = "LIST"
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        path = url.path[len("/v1/") :] if url.path.startswith("/v1/") else None
+        status, response = 404, {"errors": []}
+        try:
+            if method == "POST" and random.random() < vault.throttle_rate:
+                with vault.lock:
+                    vault.throttled += 1
+                status, response = 429, {"errors": ["rate limit quota exceeded"]}
+            elif path is not None and not vault.allowed(path):
+                status, response = 403, {"errors": ["permission denied"]}
+            elif path is not None:
+                status, response = self._route(method, path, body)
+        except Exception as e:
+            status, response = 500, {"errors": [str(e)]}
+        self._reply(status, response)
+
+    def _route(self, method, path, body):
+        vault = self.vault
+        mount, _, rest = path.partition("/")
+        if path.rstrip("/") == "sys/mounts":
+            mounts = vault.mounts()
+            return 200, dict(mounts, data=mounts)
+        if path == "sys/capabilities-self" and method == "POST":
+            capabilities = {
+                p: ["create", "read", "update", "delete", "list"]
+                if vault.allowed(p)
+                else ["deny"]
+                for p in body.get("paths", [])
+            }
+            return 200, dict(capabilities, data=capabilities)
+        if mount == KV1_MOUNT:
+            return self._kv1(vault.trees[KV1_MOUNT], method, rest, body)
+        if mount == KV2_MOUNT:
+            return self._kv2(vault.trees[KV2_MOUNT], method, rest, body)
+        if mount == IDENTITY_MOUNT:
+            return self._identity(method, rest)
+        return 404, {"errors": []}
+
+    def _kv1(self, tree, method, path, body):
+        if method == "LIST":
+            keys = tree.list(path)
+            return (200, {"data": {"keys": keys}}) if keys else (404, {"errors": []})
+        if method == "GET":
+            value = tree.read(path)
+            return (200, {"data": value}) if value else (404, {"errors": []})
+        if method == "POST":
+            tree.write(path, body)
+            return 204, None
+        if method == "DELETE":
+            tree.delete(path)
+            return 204, None
+        return 405, {"errors": []}
+
+    def _kv2(self, tree, method, path, body):
+        kind, _, path = path.partition("/")
+        if kind == "metadata":
+            if method == "LIST":
+                keys = tree.list(path)
+                if keys:
+                    return 200, {"data": {"keys": keys}}
+                return 404, {"errors": []}
+            if method == "GET":
+                if tree.read(path) is None:
+                    return 404, {"errors": []}
+                version = tree.version(path)
+                return 200, {
+                    "data": {
+                        "current_version": version,
+                        "oldest_version": 1,
+                        "updated_time": f"2020-01-01T00:00:{version:02d}Z",
+                        "versions": {
+                            str(v): {"created_time": f"2020-01-01T00:00:{v:02d}Z"}
+                            for v in range(1, version + 1)
+                        },
+                    }
+                }
+            if method == "DELETE":
+                tree.delete(path)
+                return 204, None
+        elif kind == "data":
+            if method == "GET":
+                value = tree.read(path)
+                if value is None:
+                    return 404, {"errors": []}
+                version = tree.version(path)
+                return 200, {
+                    "data": {
+                        "data": value,
+                        "metadata": {
+                            "version": version,
+                            "created_time": f"2020-01-01T00:00:{version:02d}Z",
+                        },
+                    }
+                }
+            if method == "POST":
+                tree.write(path, body.get("data", {}))
+                return 200, {"data": {"version": tree.version(path)}}
+        return 405, {"errors": []}
+
+    def _identity(self, method, path):
+        entities = self.vault.entities
+        path = path.strip("/")
+        kind, _, entity = path.partition("/id/")
+        kinds = ["entity", "entity-alias", "group", "group-alias"]
+        if method == "LIST" and path in [f"{k}/id" for k in kinds]:
+            return 200, {
+                "data": {
+                    "keys": entities,
+                    "key_info": {e: {"name": f"name-{e}"} for e in entities},
+                }
+            }
+        if method == "LIST" and path == "entity/name":
+            return 200, {"data": {"keys": [f"name-{e}" for e in entities]}}
+        if method == "LIST" and path in ["oidc/key", "oidc/role"]:
+            return 200, {"data": {"keys": ["default"]}}
+        if method == "GET" and kind in kinds and entity in entities:
+            return 200, {"data": {"id": entity, "name": f"name-{entity}"}}
+        return 404, {"errors": []}
+
+    def _reply(self, status, response):
+        payload = json.dumps(response).encode() if response is not None else b""
+        self.send_response(status)
+        if payload:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--fanout", default="10,10,100")
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--deny", default="", help="Comma separated entry names")
+    args = parser.parse_args()
+    vault = FakeVault(
+        [int(f) for f in args.fanout.split(",")],
+        args.latency,
+        port=args.port,
+        throttle_rate=args.throttle_rate,
+        denied=[d for d in args.deny.split(",") if d],
+    )
+    print(f"Serving on {vault.url}, any token is accepted")
+    vault._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
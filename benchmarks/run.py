@@ -0,0 +1,222 @@
+"""
+Benchmark suite running vaultbrowser's models against the fake vault.
+
+Measures, for a synthetic tree served with a given per-request latency:
+time from connecting a service to the first listing of a backend, folder
+listing latency through Node, value display latency, export and
+recursive delete throughput, and peak memory.
+
+    python benchmarks/run.py --fanout 10,10,100 --latency 0.005
+    python benchmarks/run.py --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json
+
+With --compare, the process exits with status 1 when any metric is worse
+than the baseline by more than --tolerance.
+"""
+import os
+import sys
+
+# Run from a checkout, where vaultbrowser is not installed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakevault import FakeVault, KV1_MOUNT, KV2_MOUNT
+from vaultbrowser.service import Service
+from vaultbrowser.vault import VaultListModel
+from vaultbrowser.vault.backends import BackendItem
+from vaultbrowser.vault.delete import RecursiveDelete
+from vaultbrowser.render import RenderCache
+from vaultbrowser import export
+import threading
+import argparse
+import resource
+import json
+import time
+
+# Metrics where a higher value is better, the rest are times
+THROUGHPUT_METRICS = {"export_secrets_per_s", "delete_secrets_per_s"}
+
+
+class NullWriter:
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+
+    def flush(self):
+        pass
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Timed out")
+        time.sleep(0.0005)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def connect(vault):
+    connected = threading.Event()
+    service = Service("bench", vault.url, "token", False)
+    service.on_connect.add(lambda *_: connected.set())
+    service.on_connect_error.add(lambda *_: connected.set())
+    service.connect()
+    connected.wait()
+    if service.error:
+        raise service.error
+    return service
+
+
+def open_backend(service, mount, cache_ttl=0):
+    model = VaultListModel()
+    model.cache_ttl = cache_ttl
+    mounts = service.client.sys.list_mounted_secrets_engines()["data"]
+    model.client = service.client
+    model.backend = BackendItem(f"{mount}/", mounts[f"{mount}/"])
+    return model
+
+
+def bench_first_paint(vault, mount):
+    started = time.perf_counter()
+    service = connect(vault)
+    model = open_backend(service, mount)
+    wait_for(lambda: model.get_root().loaded)
+    return time.perf_counter() - started
+
+
+def bench_listing(model, samples):
+    times = []
+    for folder in model.get_root().children[:samples]:
+        started = time.perf_counter()
+        model.go_to(folder)
+        wait_for(lambda: folder.loaded)
+        times.append(time.perf_counter() - started)
+        model.go_up()
+    return times
+
+
+def first_leaves(model, count):
+    node = model.get_root()
+    while True:
+        node.load()
+        wait_for(lambda: node.loaded)
+        children = node.children
+        if not children or children[0].leaf:
+            return children[:count]
+        node = children[0]
+
+
+def bench_display(model, samples):
+    render_cache = RenderCache()
+    times = []
+    for leaf in first_leaves(model, samples):
+        started = time.perf_counter()
+        render_cache.render(leaf.path, leaf.value).text
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def bench_export(model, mount, workers):
+    exporter = export.Exporter(
+        model.handler, mount, export.JsonLinesFormat, workers
+    )
+    started = time.perf_counter()
+    exporter.export("", NullWriter())
+    return exporter.crawler.leaves / (time.perf_counter() - started)
+
+
+def bench_delete(model, workers):
+    folder = model.get_root().children[-1]
+    deleter = RecursiveDelete(model.handler, workers)
+    started = time.perf_counter()
+    deleter.delete(folder.path)
+    return deleter.crawler.leaves / (time.perf_counter() - started)
+
+
+def run(args):
+    fanouts = [int(f) for f in args.fanout.split(",")]
+    vault = FakeVault(fanouts, args.latency).start()
+    results = {}
+    try:
+        for mount in [KV1_MOUNT, KV2_MOUNT]:
+            results[f"{mount}_first_paint_s"] = bench_first_paint(vault, mount)
+            model = open_backend(connect(vault), mount)
+            wait_for(lambda: model.get_root().loaded)
+
+            listing = bench_listing(model, args.samples)
+            results[f"{mount}_listing_p50_s"] = percentile(listing, 50)
+            results[f"{mount}_listing_p95_s"] = percentile(listing, 95)
+
+            display = bench_display(model, args.samples)
+            results[f"{mount}_display_p50_s"] = percentile(display, 50)
+            results[f"{mount}_display_p95_s"] = percentile(display, 95)
+
+        model = open_backend(connect(vault), KV2_MOUNT)
+        wait_for(lambda: model.get_root().loaded)
+        results["export_secrets_per_s"] = bench_export(model, KV2_MOUNT, args.workers)
+        results["delete_secrets_per_s"] = bench_delete(model, args.workers)
+    finally:
+        vault.stop()
+    results["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, value in sorted(results.items()):
+        base = baseline.get(name)
+        if not base:
+            continue
+        if name in THROUGHPUT_METRICS:
+            change = (base - value) / base
+        else:
+            change = (value - base) / base
+        status = "REGRESSION" if change > tolerance else ""
+        print(f"{name:<28} {base:12.4f} -> {value:12.4f} {change:+8.1%} {status}")
+        if status:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fanout", default="10,10,100")
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run(args)
+    results["parameters"] = {
+        "fanout": args.fanout,
+        "latency": args.latency,
+        "workers": args.workers,
+    }
+    metrics = {k: v for k, v in results.items() if k != "parameters"}
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("parameters") != results["parameters"]:
+            print("Warning: baseline was taken with different parameters")
+        if compare(metrics, baseline, args.tolerance):
+            sys.exit(1)
+    else:
+        for name, value in sorted(metrics.items()):
+            print(f"{name:<28} {value:12.4f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
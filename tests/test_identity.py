@@ -0,0 +1,38 @@
+import unittest
+from vaultbrowser.vault.backends import BackendItem
+from vaultbrowser.vault.handler import get_handler
+from vaultbrowser.vault.names import NameStore
+
+
+class FakeClient:
+    token = "token"
+
+    def list(self, path):
+        return {
+            "data": {
+                "keys": ["id-1", "id-2"],
+                "key_info": {"id-1": {"name": "alice"}, "id-2": {}},
+            }
+        }
+
+    def read(self, path):
+        return {"data": {"id": path.rpartition("/")[2]}}
+
+
+class IdentityHandlerTest(unittest.TestCase):
+    def test_list_without_service(self):
+        names = NameStore()
+        handler = get_handler(
+            FakeClient(),
+            BackendItem("identity/", {"type": "identity"}),
+            cache_ttl=0,
+            names=names,
+        )
+        self.assertEqual(handler.list("entity"), ["id-1", "id-2"])
+        self.assertEqual(handler.display_name("entity/id-1"), "alice")
+        handler.close()
+        names.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
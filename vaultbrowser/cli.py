@@ -0,0 +1,407 @@
+"""
+Non interactive commands, for scripting and bulk operations:
+
+    vaultbrowser ls [-R] SERVICE PATH
+    vaultbrowser export SERVICE PATH [-o FILE]
+    vaultbrowser import SERVICE PATH [-i FILE]
+    vaultbrowser copy SERVICE PATH TO_SERVICE TO_PATH
+    vaultbrowser diff SERVICE PATH TO_SERVICE TO_PATH [--sync]
+
+Services are the ones configured in services.ini, paths start with the
+mount name. Results are written as json lines, one per entry, and a
+summary line is written to stderr once done.
+"""
+from . import misc, export
+from .service import read_services
+from .vault.backends import BackendItem
+from .vault.crawler import Crawler, join_path
+from .vault.diff import TreeDiff, sync
+from .vault.handler import get_handler
+from .vault.writer import BulkWriter, Checkpoint
+import configparser
+import threading
+import argparse
+import json
+import time
+import sys
+import os
+
+class JsonLinesOutput:
+    """
+    Writes json objects one per line, from any thread.
+    """
+    def __init__(self, out):
+        self._out = out
+        self._lock = threading.Lock()
+
+    def emit(self, **fields):
+        line = json.dumps(fields) + "\n"
+        with self._lock:
+            self._out.write(line)
+
+
+def _connect(service):
+    if service.connected:
+        # Opened already, as when copying within a service
+        return service.client
+    done = threading.Event()
+    service.on_connect.add(lambda *_: done.set())
+    service.on_connect_error.add(lambda *_: done.set())
+    service.connect()
+    done.wait()
+    if service.error:
+        raise service.error
+    return service.client
+
+
+def _resolve(client, location):
+    """
+    Splits a location into the backend it belongs to and the path
+    inside it, picking the longest matching mount.
+    """
+    mounts = client.sys.list_mounted_secrets_engines()["data"]
+    location = location.strip("/")
+    for name in sorted(mounts, key=len, reverse=True):
+        if (location + "/").startswith(name):
+            return BackendItem(name, mounts[name]), location[len(name) :].strip("/")
+    raise ValueError(f"No mount found for {location}")
+
+
+class _Session:
+    """
+    Services and defaults read from the configuration directory.
+    """
+    def __init__(self, args):
+        config_dir = misc.config_dir()
+        parser = configparser.ConfigParser()
+        parser.read(os.path.join(config_dir, "vaultbrowser.ini"))
+        timeout = float(parser["DEFAULT"].get("connect_timeout", "10"))
+        pool_size = getattr(args, "workers", 0) + getattr(args, "writers", 0)
+        rate_limit = float(parser["DEFAULT"].get("rate_limit", "0"))
+        self._services = {
+            service.name: service
+            for service in read_services(
+                os.path.join(config_dir, "services.ini"),
+                timeout,
+                pool_size,
+                rate_limit=rate_limit,
+            )
+        }
+
+    def open(self, service_name, location):
+        """
+        Returns the handler and the path inside its backend for a location.
+        """
+        service = self._services.get(service_name)
+        if not service:
+            raise ValueError(f"Unknown service {service_name}")
+        client = _connect(service)
+        backend, path = _resolve(client, location)
+        handler = get_handler(client, backend, cache_ttl=0, service=service.name)
+        return handler, backend, path
+
+
+def _summary(started, **counters):
+    elapsed = time.monotonic() - started
+    counters["seconds"] = round(elapsed, 3)
+    sys.stderr.write(json.dumps(counters) + "\n")
+
+
+def _ls(session, args):
+    handler, backend, path = session.open(args.service, args.path)
+    output = JsonLinesOutput(sys.stdout)
+    mount = backend.name.strip("/")
+
+    def emit(entry_path, is_folder):
+        output.emit(
+            mount=mount,
+            path=entry_path + ("/" if is_folder else ""),
+            type="folder" if is_folder else "secret",
+        )
+
+    if not args.recursive:
+        for key in handler.list(path):
+            emit(join_path(path, key), key.endswith("/"))
+        return 0
+
+    def on_folder(folder_path, _):
+        if folder_path != path:
+            emit(folder_path, True)
+
+    started = time.monotonic()
+    crawler = Crawler(handler, args.workers)
+    crawler.walk(path, lambda leaf_path: emit(leaf_path, False), on_folder)
+    _summary(
+        started, folders=crawler.folders, secrets=crawler.leaves, errors=crawler.errors
+    )
+    return 1 if crawler.errors else 0
+
+
+def _export(session, args):
+    handler, backend, path = session.open(args.service, args.path)
+    exporter = export.Exporter(
+        handler, backend.name, export.FORMATS[args.format], args.workers
+    )
+    started = time.monotonic()
+    if args.output:
+        with misc.open_private(args.output) as out:
+            exporter.export(path, out)
+    else:
+        exporter.export(path, sys.stdout)
+    crawler = exporter.crawler
+    _summary(started, secrets=crawler.leaves, errors=crawler.errors)
+    return 1 if crawler.errors else 0
+
+
+def _make_writer(handler, args):
+    """
+    Returns a writer reporting each write as a json line.
+    """
+    output = JsonLinesOutput(sys.stdout)
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    writer = BulkWriter(
+        handler, args.writers, retries=args.retries, checkpoint=checkpoint
+    )
+    writer.on_written.add(lambda _, path: output.emit(path=path, status="written"))
+    writer.on_deleted.add(lambda _, path: output.emit(path=path, status="deleted"))
+    writer.on_error.add(lambda _, path, error: output.emit(path=path, error=str(error)))
+    return writer
+
+
+def _writer_summary(writer, started, **counters):
+    _summary(
+        started,
+        written=writer.written,
+        skipped=writer.skipped,
+        retried=writer.retried,
+        concurrency=writer.concurrency,
+        **counters,
+    )
+
+
+def _read_entries(lines, path):
+    for line in lines:
+        line = line.strip()
+        if line:
+            entry = json.loads(line)
+            yield join_path(path, entry["path"]), entry["data"]
+
+
+def _read_tree(directory, path):
+    """
+    Yields the json files below a directory as entries, named after
+    their path without the .json extension.
+    """
+    for folder, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.endswith(".json"):
+                file_name = os.path.join(folder, name)
+                relative = os.path.relpath(file_name, directory)[: -len(".json")]
+                with open(file_name) as f:
+                    value = json.load(f)
+                yield join_path(path, relative.replace(os.sep, "/")), value
+
+
+def _put_all(writer, entries):
+    for path, value in entries:
+        writer.put(path, value)
+
+
+def _import(session, args):
+    handler, _, path = session.open(args.service, args.path)
+    writer = _make_writer(handler, args)
+    started = time.monotonic()
+    with writer:
+        if not args.input:
+            _put_all(writer, _read_entries(sys.stdin, path))
+        elif os.path.isdir(args.input):
+            _put_all(writer, _read_tree(args.input, path))
+        else:
+            with open(args.input) as lines:
+                _put_all(writer, _read_entries(lines, path))
+    _writer_summary(writer, started, errors=writer.errors)
+    return 1 if writer.errors else 0
+
+
+def _copy(session, args):
+    source, _, source_path = session.open(args.service, args.path)
+    target, _, target_path = session.open(args.to_service, args.to_path)
+    writer = _make_writer(target, args)
+    crawler = Crawler(source, args.workers)
+    started = time.monotonic()
+
+    def on_leaf(leaf_path):
+        relative = leaf_path[len(source_path) :].strip("/")
+        writer.put(join_path(target_path, relative), source.read_value(leaf_path))
+
+    with writer:
+        crawler.walk(source_path, on_leaf)
+    _writer_summary(
+        writer, started, read=crawler.leaves, errors=crawler.errors + writer.errors
+    )
+    return 1 if crawler.errors or writer.errors else 0
+
+
+def _read_diff_state(file_name, locations):
+    """
+    Returns the versions known equal from a previous diff of the same
+    locations, or an empty dict.
+    """
+    if file_name and os.path.isfile(file_name):
+        with open(file_name) as f:
+            state = json.load(f)
+        if state.get("locations") == locations:
+            return state["known"]
+    return {}
+
+
+def _write_diff_state(file_name, locations, known):
+    with open(file_name, "w") as f:
+        json.dump({"locations": locations, "known": known}, f)
+
+
+def _diff(session, args):
+    source, _, source_path = session.open(args.service, args.path)
+    target, _, target_path = session.open(args.to_service, args.to_path)
+    locations = [args.service, args.path, args.to_service, args.to_path]
+    known = _read_diff_state(args.state, locations)
+    tree_diff = TreeDiff(source, target, args.workers, known)
+    output = JsonLinesOutput(sys.stdout)
+    tree_diff.on_difference.add(
+        lambda _, kind, path, value: output.emit(path=path, status=kind)
+    )
+    writer = None
+    if args.sync:
+        writer = _make_writer(target, args)
+        sync(tree_diff, writer, args.delete)
+    started = time.monotonic()
+    if writer:
+        with writer:
+            tree_diff.diff(source_path, target_path)
+    else:
+        tree_diff.diff(source_path, target_path)
+    if args.state:
+        _write_diff_state(args.state, locations, tree_diff.known)
+    counters = {
+        "folders": tree_diff.folders,
+        "compared": tree_diff.compared,
+        "by_metadata": tree_diff.by_metadata,
+        "differences": tree_diff.differences,
+        "errors": tree_diff.errors,
+    }
+    if writer:
+        _writer_summary(
+            writer,
+            started,
+            deleted=writer.deleted,
+            **dict(counters, errors=tree_diff.errors + writer.errors),
+        )
+    else:
+        _summary(started, **counters)
+    return 1 if counters["errors"] or (writer and writer.errors) else 0
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="vaultbrowser",
+        description=__doc__.split("\n\n")[0],
+        epilog="Without a command the interactive browser is started.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, help_text, function, reads=True):
+        command = commands.add_parser(name, help=help_text)
+        command.set_defaults(function=function)
+        command.add_argument("service", help="Service name as in services.ini")
+        command.add_argument("path", help="Path, starting with the mount name")
+        if reads:
+            command.add_argument(
+                "--workers", type=int, default=8, help="Concurrent reads, 8 by default"
+            )
+        return command
+
+    command = add_command("ls", "List entries below a path", _ls)
+    command.add_argument("-R", dest="recursive", action="store_true")
+
+    command = add_command("export", "Export secrets below a path", _export)
+    command.add_argument("-o", dest="output", help="Output file, stdout by default")
+    command.add_argument(
+        "--format", choices=sorted(export.FORMATS), default="jsonl"
+    )
+
+    def add_write_arguments(command):
+        command.add_argument(
+            "--writers",
+            type=int,
+            default=8,
+            help="Maximum concurrent writes, 8 by default. Halved while vault "
+            "answers 429 or 5xx, growing back afterwards",
+        )
+        command.add_argument(
+            "--retries",
+            type=int,
+            default=5,
+            help="Times a write failing with 429, 5xx or a connection error is "
+            "retried, 5 by default",
+        )
+        command.add_argument(
+            "--checkpoint",
+            help="File keeping written paths, running again with the same "
+            "file skips them",
+        )
+
+    command = add_command(
+        "import",
+        "Write secrets from a json lines export, or a directory of .json files, "
+        "below a path",
+        _import,
+        reads=False,
+    )
+    command.add_argument(
+        "-i", dest="input", help="Input file or directory, stdin by default"
+    )
+    add_write_arguments(command)
+
+    command = add_command(
+        "copy", "Copy secrets below a path to another service or path", _copy
+    )
+    command.add_argument("to_service")
+    command.add_argument("to_path")
+    add_write_arguments(command)
+
+    command = add_command(
+        "diff",
+        "Compare secrets below a path with the ones below another path, "
+        "reporting them as added, removed or changed in the second one",
+        _diff,
+    )
+    command.add_argument("to_service")
+    command.add_argument("to_path")
+    command.add_argument(
+        "--sync",
+        action="store_true",
+        help="Write added and changed secrets to the second path",
+    )
+    command.add_argument(
+        "--delete",
+        action="store_true",
+        help="With --sync, also delete secrets only found in the second path",
+    )
+    command.add_argument(
+        "--state",
+        help="File keeping versions of kv v2 secrets found equal, so they are "
+        "compared by metadata on the next run instead of reading them",
+    )
+    add_write_arguments(command)
+    return parser
+
+
+def main(argv):
+    args = _parser().parse_args(argv)
+    try:
+        return args.function(_Session(args), args)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        sys.stderr.write(f"{e}\n")
+        return 1
@@ -0,0 +1,120 @@
+from cdtui import ListenerHandler
+from .vault.crawler import Crawler
+import threading
+import shlex
+import json
+import time
+import re
+
+
+def _as_text(value):
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _env_name(text):
+    return re.sub(r"[^A-Za-z0-9]", "_", text).upper()
+
+
+class ShellFormat:
+    """
+    Writes secrets as vault cli commands.
+    """
+    def __init__(self, mount):
+        self._mount = mount.strip("/")
+
+    def header(self):
+        return "#!/bin/sh\n"
+
+    def format(self, path, value):
+        args = " ".join(
+            shlex.quote(f"{k}={_as_text(v)}") for k, v in (value or {}).items()
+        )
+        return f"vault kv put {shlex.quote(self._mount + '/' + path)} {args}\n"
+
+
+class JsonLinesFormat:
+    """
+    Writes one json object per secret.
+    """
+    def __init__(self, mount):
+        self._mount = mount.strip("/")
+
+    def header(self):
+        return ""
+
+    def format(self, path, value):
+        return json.dumps({"mount": self._mount, "path": path, "data": value}) + "\n"
+
+
+class DotenvFormat:
+    """
+    Writes one variable per secret key, named after the secret path.
+    """
+    def __init__(self, mount):
+        self._mount = mount
+
+    def header(self):
+        return ""
+
+    def format(self, path, value):
+        prefix = _env_name(path)
+        return "".join(
+            f"{prefix}_{_env_name(k)}={json.dumps(_as_text(v))}\n"
+            for k, v in (value or {}).items()
+        )
+
+
+FORMATS = {"sh": ShellFormat, "jsonl": JsonLinesFormat, "env": DotenvFormat}
+
+
+def format_for(file_name):
+    """
+    Picks the export format from the file extension, shell script by default.
+    """
+    extension = file_name.rsplit(".", 1)[-1] if "." in file_name else ""
+    return FORMATS.get(extension, ShellFormat)
+
+
+class Exporter:
+    """
+    Exports a subtree of a backend, values are read in parallel and
+    streamed to the output file as soon as they arrive.
+    """
+    def __init__(self, handler, mount, fmt, workers=8, progress_interval=0.5):
+        self._on_progress = ListenerHandler(self)
+        self._handler = handler
+        self._format = fmt(mount)
+        self._crawler = Crawler(handler, workers)
+        self._lock = threading.Lock()
+        self._progress_interval = progress_interval
+        self._last_progress = 0
+
+    @property
+    def on_progress(self):
+        return self._on_progress
+
+    @property
+    def crawler(self):
+        return self._crawler
+
+    def cancel(self):
+        self._crawler.cancel()
+
+    def export(self, path, out):
+        out.write(self._format.header())
+
+        def on_leaf(leaf_path):
+            text = self._format.format(leaf_path, self._handler.read_value(leaf_path))
+            with self._lock:
+                out.write(text)
+            self._notify_progress()
+
+        self._crawler.walk(path, on_leaf)
+        out.flush()
+        self._on_progress(self._crawler)
+
+    def _notify_progress(self):
+        now = time.monotonic()
+        if now - self._last_progress >= self._progress_interval:
+            self._last_progress = now
+            self._on_progress(self._crawler)
@@ -0,0 +1,231 @@
+from cdtui import ansi, COLORS
+from . import misc
+import subprocess
+import selectors
+import threading
+import logging
+import shlex
+import json
+import re
+import uuid
+import time
+import os
+
+COLORS.setdefault("valueview.key", "\u001b[34;1m")
+COLORS.setdefault("valueview.string", "\u001b[32m")
+COLORS.setdefault("valueview.number", "\u001b[36m")
+COLORS.setdefault("valueview.literal", "\u001b[35m")
+COLORS.setdefault("valueview.punctuation", "")
+
+# Highlighter written by default in vaultbrowser.ini by older versions,
+# it gives the same output as the internal colorizer
+_LEGACY_DEFAULT = re.compile(r"cat\s+\{file\}\s*\|\s*(/usr/bin/)?jq\s+-C\s*")
+
+COLLAPSE_ITEMS = 100
+COLLAPSE_STRING = 4096
+
+
+def _colored(color, text):
+    return f"{color}{text}{ansi.RESET}" if color else text
+
+
+def iter_colorized(value, indent=4, collapse=False):
+    """
+    Yields the pieces of value formatted as indented json, with ansi colors
+    taken from the valueview.* color keys. When collapse is set, nested
+    objects and arrays over COLLAPSE_ITEMS entries and strings over
+    COLLAPSE_STRING characters are only summarized.
+    """
+    key_color = COLORS["valueview.key"]
+    string_color = COLORS["valueview.string"]
+    number_color = COLORS["valueview.number"]
+    literal_color = COLORS["valueview.literal"]
+    punctuation_color = COLORS["valueview.punctuation"]
+
+    def colorize(value, level):
+        if collapse and level > 0:
+            summary = _summary(value)
+            if summary:
+                yield _colored(literal_color, summary)
+                return
+        if isinstance(value, dict):
+            if not value:
+                yield _colored(punctuation_color, "{}")
+                return
+            yield _colored(punctuation_color, "{")
+            inner = "\n" + " " * (indent * (level + 1))
+            first = True
+            for k, v in value.items():
+                yield ("" if first else _colored(punctuation_color, ",")) + inner
+                first = False
+                yield _colored(key_color, json.dumps(str(k)))
+                yield _colored(punctuation_color, ":") + " "
+                yield from colorize(v, level + 1)
+            yield "\n" + " " * (indent * level) + _colored(punctuation_color, "}")
+        elif isinstance(value, (list, tuple)):
+            if not value:
+                yield _colored(punctuation_color, "[]")
+                return
+            yield _colored(punctuation_color, "[")
+            inner = "\n" + " " * (indent * (level + 1))
+            first = True
+            for v in value:
+                yield ("" if first else _colored(punctuation_color, ",")) + inner
+                first = False
+                yield from colorize(v, level + 1)
+            yield "\n" + " " * (indent * level) + _colored(punctuation_color, "]")
+        elif isinstance(value, str):
+            yield _colored(string_color, json.dumps(value))
+        elif value is None or isinstance(value, bool):
+            yield _colored(literal_color, json.dumps(value))
+        else:
+            yield _colored(number_color, json.dumps(value))
+
+    return colorize(value, 0)
+
+
+def _summary(value):
+    if isinstance(value, dict) and len(value) > COLLAPSE_ITEMS:
+        return f"{{\u2026 {len(value)} keys}}"
+    if isinstance(value, (list, tuple)) and len(value) > COLLAPSE_ITEMS:
+        return f"[\u2026 {len(value)} items]"
+    if isinstance(value, str) and len(value) > COLLAPSE_STRING:
+        return json.dumps(value[:COLLAPSE_STRING]) + f"\u2026 ({len(value)} chars)"
+    return None
+
+
+def collapsed(value, level=0):
+    """
+    Returns a copy of value with the entries iter_colorized would only
+    summarize replaced by their summary, for external highlighters.
+    """
+    if level > 0:
+        summary = _summary(value)
+        if summary:
+            return summary
+    if isinstance(value, dict):
+        return {k: collapsed(v, level + 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [collapsed(v, level + 1) for v in value]
+    return value
+
+
+def colorize(value, indent=4):
+    return "".join(iter_colorized(value, indent))
+
+
+class CoprocessHighlighter:
+    """
+    Highlights through an external filter kept running, like
+    "jq -C --unbuffered .". Each value is followed by a marker string
+    so the end of its output can be told apart. A filter taking over
+    timeout seconds to echo the marker, as one buffering its output
+    would, is killed and the value left to the caller to color.
+    """
+    def __init__(self, command, timeout=2):
+        self._command = command
+        self._timeout = timeout
+        self._marker = f"vaultbrowser-{uuid.uuid4().hex}"
+        self._process = None
+        self._lock = threading.Lock()
+
+    def highlight(self, value):
+        with self._lock:
+            try:
+                return self._exchange(value)
+            except Exception:
+                self.close()
+                raise
+
+    def close(self):
+        if self._process:
+            try:
+                self._process.kill()
+                self._process.wait()
+            except Exception as e:
+                logging.warning(f"Unable to stop highlighter {e}")
+            self._process = None
+
+    def _exchange(self, value):
+        if not self._process or self._process.poll() is not None:
+            self._process = subprocess.Popen(
+                shlex.split(self._command),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            os.set_blocking(self._process.stdin.fileno(), False)
+        request = (
+            json.dumps(value, indent=4) + "\n" + json.dumps(self._marker) + "\n"
+        ).encode()
+        marker = self._marker.encode()
+        stdin = self._process.stdin.fileno()
+        stdout = self._process.stdout.fileno()
+        deadline = time.monotonic() + self._timeout
+        output = b""
+        with selectors.DefaultSelector() as selector:
+            # Written as the filter reads, it may block writing big values
+            selector.register(stdin, selectors.EVENT_WRITE)
+            selector.register(stdout, selectors.EVENT_READ)
+            while marker not in output:
+                remaining = deadline - time.monotonic()
+                events = selector.select(remaining) if remaining > 0 else []
+                if not events:
+                    raise TimeoutError(
+                        f"Highlighter {self._command} took over {self._timeout}s"
+                    )
+                for key, _ in events:
+                    if key.fd == stdin:
+                        request = request[os.write(stdin, request) :]
+                        if not request:
+                            selector.unregister(stdin)
+                    else:
+                        chunk = os.read(stdout, 65536)
+                        if not chunk:
+                            raise IOError(f"Highlighter {self._command} exited")
+                        output += chunk
+        # The marker line is dropped, colors included
+        end = output.rfind(b"\n", 0, output.index(marker)) + 1
+        return output[:end].decode(errors="replace")
+
+
+class FileHighlighter:
+    """
+    Highlights by running a command on a temporary file, referenced
+    as {file} in the command. Spawns a process for every value.
+    """
+    def __init__(self, command):
+        self._command = command
+
+    def highlight(self, value):
+        tf = misc.make_tempfile(json.dumps(value, indent=4), "json")
+        try:
+            result = subprocess.check_output(
+                self._command.format(file=tf.name), shell=True
+            )
+            return result.decode()
+        finally:
+            tf.close()
+            os.remove(tf.name)
+
+    def close(self):
+        pass
+
+
+def make_highlighter(command):
+    """
+    Returns the external highlighter for a command, or None when values
+    are better colored internally, as for the old default highlighter.
+    Commands with a {file} placeholder are run once per value on a
+    temporary file.
+    """
+    if _LEGACY_DEFAULT.fullmatch(command.strip()):
+        logging.info(f"Highlighter {command} replaced by internal colors")
+        return None
+    if "{file}" in command:
+        logging.warning(
+            f"Highlighter {command} is started for every value, prefer "
+            "a filter reading its standard input"
+        )
+        return FileHighlighter(command)
+    return CoprocessHighlighter(command)
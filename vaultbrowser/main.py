@@ -1,8 +1,5 @@
 import logging
 
-logging.basicConfig(
-    filename="vaultbrowser.log", format="%(message)s", level=logging.DEBUG
-)
 from cdtui import (
     ansi,
     kbd,
@@ -16,17 +13,38 @@ from cdtui import (
     QuestionDialog,
     InputDialog,
 )
-from . import misc, texts
-from .vault import VaultListModel, ServicesListModel, BackendListModel
-from .service import Service
+from . import misc, texts, export, highlight, cli
+from .render import RenderCache
+from .metrics import Metrics
+from .vault import (
+    VaultListModel,
+    ServicesListModel,
+    BackendListModel,
+    Placeholder,
+    LOADING,
+    SearchResultsModel,
+)
+from .vault.delete import RecursiveDelete
+from .vault.diff import TreeDiff, ADDED, REMOVED
+from .vault.globalsearch import GlobalSearch
+from .vault.prefetch import Prefetcher
+from .vault.listmodel import Node
+from .vault.snapshot import SnapshotStore
+from .vault.names import NameStore
+from .vault.scheduler import PRIORITY_HIGH
+from .service import ConnectionManager, read_services
 import json
 import tempfile
 import subprocess
 import configparser
 import traceback
+import threading
 import sys
 import os
 
+# Entries the token isn't allowed to open
+COLORS.setdefault("tree.denied", "\u001b[2m")
+
 
 class VaultBrowser(Application):
     def __init__(self):
@@ -48,8 +66,18 @@ class VaultBrowser(Application):
         self._backends_list.item_renderer = self._render_backend
 
         self._vault_model = VaultListModel()
+        self._vault_model.on_current_refreshed.add(self._on_tree_refreshed)
+        self._value_request = None
+        self._task = None
+        self._pending_service = None
+        self._displayed = None
+        self._diff_source = None
+        self._diff_known = {}
+        self._prefetcher = Prefetcher(self._vault_model)
+        self._highlighted = None
         self._tree = ListView(model=self._vault_model, selectable=True)
         self._tree.on_select.add(self._on_select)
+        self._tree.item_renderer = self._render_node
 
         h1 = int((max_height - 1) / 4)
         w1 = int(max_width / 3)
@@ -83,6 +111,15 @@ class VaultBrowser(Application):
         self.set_key_handler(kbd.keystroke_from_str("d"), self._do_delete, False)
         self.set_key_handler(kbd.keystroke_from_str("D"), self._do_delete_recursively, False)
         self.set_key_handler(kbd.keystroke_from_str("E"), self._do_export, False)
+        self.set_key_handler(kbd.keystroke_from_str("c"), self._cancel_task, False)
+        self.set_key_handler(kbd.keystroke_from_str("="), self._do_diff, False)
+        self.set_key_handler(kbd.keystroke_from_str("/"), self._do_search, False)
+        self.set_key_handler(kbd.keystroke_from_str("g"), self._do_global_search, False)
+        self.set_key_handler(kbd.keystroke_from_str("i"), self._show_service_info, False)
+        self.set_key_handler(kbd.keystroke_from_str("s"), self._show_metrics, False)
+        self.set_key_handler(kbd.keystroke_from_str("v"), self._show_versions, False)
+        self.set_key_handler(kbd.keystroke_from_str("m"), self._show_more, False)
+        self.set_key_handler(kbd.keystroke_from_str("x"), self._expand_value, False)
         self.set_key_handler(kbd.keystroke_from_str("h"), self._show_help, False)
 
         self._read_config()
@@ -100,21 +137,24 @@ class VaultBrowser(Application):
         dialog = QuestionDialog(title, message, options)
         self.open_popup(dialog)
 
-    def show_input_dialog(self, title, on_confirm):
+    def show_input_dialog(self, title, on_confirm, disallowed_chars=" /\\&%"):
         def _wrap_op(f):
             def call(input_str):
-                f(input_str)
                 self.close_popup()
+                f(input_str)
 
             return call
 
-        dialog = InputDialog(title, _wrap_op(on_confirm), disallowed_chars=" /\\&%")
+        dialog = InputDialog(
+            title, _wrap_op(on_confirm), disallowed_chars=disallowed_chars
+        )
         self.open_popup(dialog)
 
     def _read_config(self):
-        config_dir = os.path.join(os.environ["HOME"], ".vaultbrowser")
+        config_dir = misc.config_dir()
         if not os.path.isdir(config_dir):
             os.makedirs(config_dir)
+        self._state_file = os.path.join(config_dir, "state.ini")
         self._read_general_config(config_dir)
         self._read_services_config(config_dir)
 
@@ -125,8 +165,70 @@ class VaultBrowser(Application):
         parser = configparser.ConfigParser()
         parser.read(config_file)
         self._editor = parser["DEFAULT"]["editor"]
-        self._highlighter = parser["DEFAULT"].get("highlighter")
-        logging.info(self._highlighter)
+        highlighter = parser["DEFAULT"].get("highlighter")
+        self._highlighter = None
+        if highlighter:
+            self._highlighter = highlight.make_highlighter(highlighter)
+        self._render_cache = RenderCache(
+            page_lines=int(parser["DEFAULT"].get("page_lines", "500"))
+        )
+        self._vault_model.scheduler.max_workers = int(
+            parser["DEFAULT"].get("workers", "4")
+        )
+        self._vault_model.cache_ttl = float(parser["DEFAULT"].get("cache_ttl", "30"))
+        self._vault_model.cache_size = int(parser["DEFAULT"].get("cache_size", "1024"))
+        self._vault_model.node_budget = int(
+            parser["DEFAULT"].get("node_budget", "200000")
+        )
+        self._vault_model.refresh_interval = float(
+            parser["DEFAULT"].get("refresh_interval", "0")
+        )
+        self._vault_model.start_refresh()
+        self._vault_model.check_capabilities = (
+            parser["DEFAULT"].get("check_capabilities", "true").lower() == "true"
+        )
+        self._prefetch_depth = int(parser["DEFAULT"].get("prefetch_depth", "1"))
+        # Leave at least one worker free for what the user asks for
+        self._prefetcher.max_requests = max(
+            1,
+            min(
+                int(parser["DEFAULT"].get("prefetch_requests", "2")),
+                self._vault_model.scheduler.max_workers - 1,
+            ),
+        )
+        self._prefetcher.max_bytes = int(
+            parser["DEFAULT"].get("prefetch_bytes", "1048576")
+        )
+        self._crawl_workers = int(parser["DEFAULT"].get("crawl_workers", "8"))
+        self._delete_workers = int(parser["DEFAULT"].get("delete_workers", "4"))
+        self._global_search_workers = int(
+            parser["DEFAULT"].get("global_search_workers", "4")
+        )
+        self._delete_rate = float(parser["DEFAULT"].get("delete_rate", "0"))
+        self._connections = ConnectionManager(
+            int(parser["DEFAULT"].get("connect_workers", "4"))
+        )
+        self._connect_on_start = parser["DEFAULT"].get("connect_on_start", "all")
+        self._connect_timeout = float(parser["DEFAULT"].get("connect_timeout", "10"))
+        # Enough connections for navigation and a crawl running together
+        self._pool_size = self._vault_model.scheduler.max_workers + max(
+            self._crawl_workers, self._delete_workers
+        )
+        self._rate_limit = float(parser["DEFAULT"].get("rate_limit", "0"))
+        self._metrics = None
+        if parser["DEFAULT"].get("metrics", "true").lower() == "true":
+            self._metrics = Metrics()
+        self._vault_model.metrics = self._metrics
+        self._metrics_file = parser["DEFAULT"].get("metrics_file")
+        if parser["DEFAULT"].get("snapshots", "true").lower() == "true":
+            self._vault_model.snapshots = SnapshotStore(
+                os.path.join(config_dir, "snapshots.db")
+            )
+        if parser["DEFAULT"].get("identity_names", "true").lower() == "true":
+            self._vault_model.names = NameStore(os.path.join(config_dir, "names.db"))
+        else:
+            self._vault_model.names = NameStore()
+        logging.info(highlighter)
 
     def _read_services_config(self, config_dir):
 
@@ -135,31 +237,47 @@ class VaultBrowser(Application):
         if not os.path.isfile(config_file):
             self._create_default_services_file(config_file)
 
-        parser = configparser.ConfigParser()
-        parser.read(config_file)
+        services = read_services(
+            config_file,
+            self._connect_timeout,
+            self._pool_size,
+            self._metrics,
+            self._prefetch_depth,
+            self._rate_limit,
+        )
+        for service in services:
+            service.on_connect.add(self._on_service_connected)
+            service.on_connect_error.add(self._on_service_connect_error)
 
-        services = []
+        self._services_model.services = services
 
-        for service_name in parser.sections():
-            config = parser[service_name]
-            service = Service(
-                service_name,
-                config["url"],
-                config["token"],
-                config.get("verify", "false").lower() == "true",
-            )
-            service.connect()
-            services.append(service)
+        last_service = self._read_state().get("last_service")
+        if self._connect_on_start == "all":
+            self._connections.connect_all(services, last_service)
+        elif self._connect_on_start == "last":
+            for service in services:
+                if service.name == last_service:
+                    self._connections.connect(service)
 
-        self._services_model.services = services
+    def _read_state(self):
+        parser = configparser.ConfigParser()
+        parser.read(self._state_file)
+        return parser["DEFAULT"]
+
+    def _write_state(self, **values):
+        parser = configparser.ConfigParser()
+        parser.read(self._state_file)
+        parser["DEFAULT"].update(values)
+        try:
+            with open(self._state_file, "w") as f:
+                parser.write(f)
+        except Exception as e:
+            logging.error(f"Unable to save state {e}")
 
     def _create_default_general_config(self, config_file):
         template = "[DEFAULT]\n" + "editor=/usr/bin/vi\n"
-        # Put as default a well known json highlighter
-        if os.path.isfile("/usr/bin/jq"):
-            template += "highlighter=cat {file}|/usr/bin/jq -C\n"
-        else:
-            template += "#highlighter=/path/to/some/json/highlighter {file}"
+        # Values are colored internally, an external filter is optional
+        template += "#highlighter=/usr/bin/jq -C --unbuffered .\n"
 
         with open(config_file, "w") as f:
             f.write(template)
@@ -180,17 +298,20 @@ class VaultBrowser(Application):
 
     def _render_service(self, view, item):
         status = ansi.begin()
+        status_len = 3
         if item.connected:
-            status.fg(2).write("(C)").reset()
+            latency = f"{item.connect_time * 1000:.0f}ms "
+            status_len += len(latency)
+            status.write(latency).fg(2).write("(C)").reset()
         elif item.connecting:
             status.fg(3).write("...").reset()
         elif item.error:
             status.fg(1).write("<X>").reset()
         status = str(status)
-        
+
         return (
             item.name
-            + (" "* (view.rect.width - (len(item.name)+3)))
+            + (" " * (view.rect.width - (len(item.name) + status_len)))
             + status
         )
 
@@ -203,28 +324,58 @@ class VaultBrowser(Application):
         )
 
     def _on_service_selected(self, view, item):
-        if not item.error:
+        if not item.connected:
+            # Selection is completed once connected
+            self._pending_service = item
+            if item.error:
+                self._show_error(item.error)
+            self._connections.connect(item)
+            self._services_model.notify_list_changed()
+        else:
+            self._pending_service = None
+            self._write_state(last_service=item.name)
+            self._cancel_value_request()
+            self._vault_model.service_name = item.name
+            self._prefetcher.clear()
+            self._prefetcher.service_name = item.name
+            self._prefetcher.depth = item.prefetch_depth
             self._backends_model.client = item.client
             self._vault_model.client = item.client
             self._vault_model.backend = None
             self._textview.text = ""
+            self._displayed = None
             self.set_focused_view(self._backends_title)
-        else:
-            self._show_error(item.error)
+
+    def _on_service_connected(self, service):
+        if service is self._pending_service:
+            self._on_service_selected(self._services_list, service)
+
+    def _on_service_connect_error(self, service, error):
+        if service is self._pending_service:
+            self._pending_service = None
+            self._show_error(error)
 
     def _on_backend_selected(self, view, item):
+        self._cancel_value_request()
+        self._prefetcher.clear()
         self._vault_model.backend = item
         self._textview.text = ""
+        self._displayed = None
         self.set_focused_view(self._tree_title)
 
     def _on_select(self, tree, item):
         try:
+            if isinstance(item, Placeholder):
+                return
             if item == "..":
+                self._cancel_value_request()
                 tree.model.go_up()
                 self._set_path_title(tree.model.get_current().path)
             elif item.leaf:
                 self._show_selected_item(item)
             else:
+                self._cancel_value_request()
+                self._prefetcher.entered(item)
                 tree.model.go_to(item)
                 self._set_path_title(item.path)
         except Exception as e:
@@ -232,11 +383,124 @@ class VaultBrowser(Application):
             logging.error(f"{e} - {traceback.format_exc()}")
 
     def _show_selected_item(self, item):
-        value = item.value
+        self._cancel_value_request()
         self._breadcrumb.title = item.path
+        path = item.path
+        if not self._vault_model.allowed(item):
+            self._textview.text = "Permission denied"
+            return
+        value = self._prefetcher.take(item)
+        if value is not None:
+            self._display_entry(value, path)
+            return
+        self._textview.text = str(LOADING)
+        self._value_request = self._vault_model.scheduler.submit(
+            lambda: item.value,
+            lambda value: self._display_entry(value, path),
+            self._on_value_error,
+            PRIORITY_HIGH,
+        )
+
+    def _render_node(self, view, item):
+        # Rows are rendered after each move, a new highlight is noticed here
+        highlighted = view.current_item
+        if highlighted is not self._highlighted:
+            self._highlighted = highlighted
+            if isinstance(highlighted, Node):
+                self._prefetch_around(highlighted)
+        if not isinstance(item, Node):
+            return str(item)
+        text = str(item)
+        name = self._vault_model.display_name(item)
+        if name:
+            text = f"{name} ({text[:8]})"
+        if not self._vault_model.allowed(item):
+            return f"{COLORS['tree.denied']}{text}{ansi.RESET}"
+        return text
+
+    def _on_tree_refreshed(self, model):
+        # Rows moved, the cursor follows the entry it was on
+        highlighted = self._highlighted
+        if isinstance(highlighted, Node) and highlighted.parent is model.get_current():
+            row = model.row_of(highlighted.name)
+            if row is not None:
+                self._tree.current_index = row
+
+    def _prefetch_around(self, node):
+        current = self._vault_model.get_current()
+        if current and current.loaded:
+            children = current.children
+            try:
+                self._prefetcher.focus(children, children.index(node))
+            except ValueError:
+                pass
+
+    def _show_versions(self, *_):
+        item = self._tree.current_item
+        handler = self._vault_model.handler
+        if not isinstance(item, Node) or not item.leaf or not handler:
+            return
+        path = item.path
+        if not handler.versioned:
+            self._show_text_popup(f"No versions are kept of {path}")
+            return
+        self._vault_model.scheduler.submit(
+            lambda: handler.read_history(path),
+            lambda history: self._show_history(handler, path, history),
+            self._show_error,
+            PRIORITY_HIGH,
+        )
 
-        self._display_entry(value)
+    def _show_history(self, handler, path, history):
+        if not history:
+            self._show_text_popup(f"No versions are kept of {path}")
+            return
+        versions_list = ListView(model=SearchResultsModel(history), selectable=True)
+        versions_list.item_renderer = self._render_version
+        versions_list.on_select.add(
+            lambda view, version: self._on_version_selected(handler, path, version)
+        )
+        self.open_popup(
+            TitledView(
+                rect=self._popup_rect(), title=f"Versions of {path}", inner=versions_list
+            )
+        )
 
+    def _render_version(self, view, item):
+        text = f"{item['version']:>5}  {item['created_time']}"
+        if item["destroyed"]:
+            text += "  destroyed"
+        elif item["deletion_time"]:
+            text += "  deleted"
+        if item["current"]:
+            text += "  (current)"
+        return text
+
+    def _on_version_selected(self, handler, path, version):
+        self.close_popup()
+        if version["destroyed"] or version["deletion_time"]:
+            self._show_text_popup(f"Version {version['version']} was deleted")
+            return
+        self._cancel_value_request()
+        self._breadcrumb.title = f"{path} (version {version['version']})"
+        self._textview.text = str(LOADING)
+        # Rendered apart from the current value, so going back to it is free
+        render_key = f"{path}@{version['version']}"
+        self._value_request = self._vault_model.scheduler.submit(
+            lambda: handler.read_value_at(path, version["version"]),
+            lambda value: self._display_entry(value, render_key),
+            self._on_value_error,
+            PRIORITY_HIGH,
+        )
+
+    def _on_value_error(self, error):
+        self._textview.text = ""
+        self._show_error(error)
+
+    def _cancel_value_request(self):
+        if self._value_request:
+            self._value_request.cancel()
+            self._value_request = None
 
     def _set_path_title(self, path):
         if len(path) > 40:
@@ -246,24 +510,31 @@ class VaultBrowser(Application):
     def _do_add(self, *_):
         self.show_input_dialog("Enter entry name", self._on_add_name_confirmed)
 
-    def _display_entry(self, value):
+    def _display_entry(self, value, path=None, expanded=False):
+        rendered = None
         if self._highlighter:
-            tf = misc.make_tempfile(json.dumps(value,indent=4),'json')
             try:
-                result = subprocess.check_output(
-                    self._highlighter.format(file=tf.name), shell=True
+                rendered = self._render_cache.render(
+                    path, value, expanded, self._highlighter
                 )
-                self._textview.text = result.decode()
             except Exception as e:
                 logging.error(e)
-                self._textview.text = json.dumps(value, indent=4)
-            finally:
-                self._drop_file(tf)
-        else:
-            text = json.dumps(value,indent=4)
-            logging.info(text)
-            self._textview.text = json.dumps(value, indent=4)
-
+        if not rendered:
+            rendered = self._render_cache.render(path, value, expanded)
+        self._displayed = (path, value, rendered)
+        self._textview.text = rendered.text
+
+    def _show_more(self, *_):
+        if self._displayed:
+            _, _, rendered = self._displayed
+            if not rendered.complete:
+                rendered.render_more()
+                self._textview.text = rendered.text
+
+    def _expand_value(self, *_):
+        if self._displayed:
+            path, value, _ = self._displayed
+            self._display_entry(value, path, True)
 
     def _on_add_name_confirmed(self, entry_name):
         selected = self._tree.model.get_current()
@@ -281,6 +552,7 @@ class VaultBrowser(Application):
                 logging.error(f"{e} - {traceback.format_exc()}")
                 self._show_error(e) 
                 self._textview.text = ""
+                self._displayed = None
         self._drop_file(tf)
         self.refresh()
 
@@ -294,7 +566,9 @@ class VaultBrowser(Application):
             try:
                 edited_stuff = json.load(tf)
                 selected.value = edited_stuff
-                self._display_entry(selected.value)
+                self._prefetcher.forget(selected)
+                self._render_cache.invalidate(selected.path)
+                self._display_entry(selected.value, selected.path)
             except ValueError as e:
                 self._show_error(e)
             except Exception as e:
@@ -303,11 +577,12 @@ class VaultBrowser(Application):
         self.refresh()
 
     def _do_delete(self, *_):
-        parent = self._tree.model.get_current()
         item = self._tree.current_item
+        if isinstance(item, Placeholder) or item == "..":
+            return
 
         def confirm():
-            item.remove()
+            self._prefetcher.forget(item)
             self._tree.model.remove_child(item)
 
         def cancel():
@@ -320,11 +595,21 @@ class VaultBrowser(Application):
         )
 
     def _do_delete_recursively(self, *_):
-        parent = self._tree.model.get_current()
         item = self._tree.current_item
+        if isinstance(item, Placeholder) or item == "..":
+            return
+
         def confirm():
-            item.remove()
-            self._tree.model.remove_child(item, False)
+            self._prefetcher.forget(item)
+            deleter = RecursiveDelete(
+                self._vault_model.handler, self._delete_workers, self._delete_rate
+            )
+            deleter.on_progress.add(
+                lambda _, crawler: self._show_task_progress("Deleted", crawler)
+            )
+            self._run_task(
+                deleter, lambda: self._tree.model.remove_child(item, True, deleter)
+            )
 
         def cancel():
             pass
@@ -336,13 +621,285 @@ class VaultBrowser(Application):
         )
 
     def _do_export(self, *_):
-        pass
+        current = self._vault_model.get_current()
+        if current:
+            self.show_input_dialog(
+                "Export to file (.sh, .jsonl or .env)",
+                lambda file_name: self._on_export_file_confirmed(current, file_name),
+                disallowed_chars=" &%",
+            )
+
+    def _on_export_file_confirmed(self, node, file_name):
+        exporter = export.Exporter(
+            self._vault_model.handler,
+            self._vault_model.backend.name,
+            export.format_for(file_name),
+            self._crawl_workers,
+        )
+        exporter.on_progress.add(
+            lambda _, crawler: self._show_task_progress("Exported", crawler)
+        )
+
+        def run():
+            with misc.open_private(os.path.expanduser(file_name)) as f:
+                exporter.export(node.path, f)
+
+        self._run_task(exporter, run)
+
+    def _do_diff(self, *_):
+        current = self._vault_model.get_current()
+        handler = self._vault_model.handler
+        if not current or not handler:
+            return
+        location = (
+            self._vault_model.service_name,
+            self._vault_model.backend.name,
+            current.path,
+        )
+        if not self._diff_source or self._diff_source[0] == location:
+            # First press marks the folder to compare from, pressing again unmarks
+            marked = not self._diff_source
+            self._diff_source = (location, handler) if marked else None
+            if marked:
+                self._breadcrumb.title = (
+                    f"Comparing from {self._location_str(location)}, "
+                    "press = on another folder"
+                )
+            return
+        (source_location, source), self._diff_source = self._diff_source, None
+        known = self._diff_known.setdefault((source_location, location), {})
+        tree_diff = TreeDiff(source, handler, self._crawl_workers, known)
+        differences = []
+        tree_diff.on_difference.add(
+            lambda _, kind, path, value: differences.append((path, kind))
+        )
+        self._breadcrumb.title = "Comparing\u2026"
+
+        def run():
+            tree_diff.diff(source_location[2], current.path)
+            self._show_diff(source_location, location, tree_diff, differences)
+
+        self._run_task(tree_diff, run)
+
+    def _location_str(self, location):
+        service_name, backend_name, path = location
+        return f"{service_name}:{backend_name}{path}"
+
+    def _show_diff(self, source_location, location, tree_diff, differences):
+        marks = {ADDED: "+", REMOVED: "-"}
+        text = (
+            f"{ansi.BOLD}{self._location_str(source_location)} -> "
+            f"{self._location_str(location)}{ansi.RESET}\n\n"
+            f"{tree_diff.compared} secrets compared, {len(differences)} differences"
+        )
+        if tree_diff.errors:
+            text += f", {tree_diff.errors} errors"
+        if tree_diff.cancelled:
+            text += " (cancelled)"
+        text += "\n+ only in the first one, - only in the second one, ~ changed\n\n"
+        text += "\n".join(
+            f"{marks.get(kind, '~')} {path}" for path, kind in sorted(differences)
+        )
+        self._breadcrumb.title = ""
+        self._show_text_popup(text)
+
+    def _run_task(self, task, target):
+        """
+        Runs a long operation in background, only one at a time.
+        The task can be stopped with _cancel_task.
+        """
+        if self._task:
+            self._show_error("Another task is already running")
+            return
+
+        def run():
+            try:
+                target()
+            except Exception as e:
+                logging.error(f"{e} - {traceback.format_exc()}")
+                self._show_error(e)
+            finally:
+                if self._task is task:
+                    self._task = None
+
+        self._task = task
+        threading.Thread(target=run, daemon=True).start()
+
+    def _cancel_task(self, *_):
+        if self._task:
+            self._task.cancel()
+
+    def _show_task_progress(self, action, crawler):
+        status = f"{action} {crawler.leaves} secrets, {crawler.rate:.0f}/s"
+        if crawler.errors:
+            status += f", {crawler.errors} errors"
+        if crawler.cancelled:
+            status += " (cancelled)"
+        self._breadcrumb.title = status
+
+    def _do_search(self, *_):
+        if self._vault_model.handler:
+            self._vault_model.build_index(self._crawl_workers)
+            self.show_input_dialog(
+                "Search path", self._on_search_confirmed, disallowed_chars="&%"
+            )
+
+    def _on_search_confirmed(self, query):
+        index = self._vault_model.index
+        results = index.search(query)
+        title = f"{len(results)} matches in {len(index)} paths"
+        crawler = self._vault_model.build_index()
+        if crawler and crawler.running:
+            title += " (indexing\u2026)"
+        results_list = ListView(model=SearchResultsModel(results), selectable=True)
+        results_list.on_select.add(self._on_search_result_selected)
+        self.open_popup(
+            TitledView(rect=self._popup_rect(), title=title, inner=results_list)
+        )
+
+    def _on_search_result_selected(self, view, path):
+        self.close_popup()
+        self._go_to_path(path)
+
+    def _go_to_path(self, path):
+        self._cancel_value_request()
+        node = self._vault_model.go_to_path(path)
+        self._set_path_title(self._vault_model.get_current().path)
+        if node.leaf:
+            self._show_selected_item(node)
+        self.set_focused_view(self._tree_title)
+
+    def _do_global_search(self, *_):
+        services = [s for s in self._services_model.services if s.connected]
+        if not services:
+            self._show_error("No service is connected")
+            return
+        self.show_input_dialog(
+            "Search path in every connected service",
+            lambda query: self._on_global_search_confirmed(services, query),
+            disallowed_chars="&%",
+        )
+
+    def _on_global_search_confirmed(self, services, query):
+        if not query.strip():
+            return
+        if self._task:
+            self._show_error("Another task is already running")
+            return
+        search = GlobalSearch(
+            services,
+            self._global_search_workers,
+            metrics=self._metrics,
+            flights=self._vault_model.flights,
+        )
+        results = SearchResultsModel()
+        results_list = ListView(model=results, selectable=True)
+        results_list.on_select.add(self._on_global_hit_selected)
+        results_view = TitledView(
+            rect=self._popup_rect(),
+            title=self._global_search_title(search),
+            inner=results_list,
+        )
+
+        def on_match(_, hit):
+            results.add_result(hit)
+            results_view.title = self._global_search_title(search)
+
+        def run():
+            search.search(query)
+            results_view.title = self._global_search_title(search)
+
+        search.on_match.add(on_match)
+        self.open_popup(results_view)
+        self._run_task(search, run)
+
+    def _global_search_title(self, search):
+        title = f"{search.matches} matches in {len(search.services)} services"
+        if search.errors:
+            title += f", {search.errors} errors"
+        if search.cancelled:
+            title += " (stopped)"
+        elif search.running or not search.elapsed:
+            title += " (searching\u2026)"
+        return title
+
+    def _on_global_hit_selected(self, view, hit):
+        self.close_popup()
+        self._cancel_task()
+        self._on_service_selected(self._services_list, hit.service)
+        backend = self._backends_model.backend_named(hit.backend.name)
+        if backend:
+            self._on_backend_selected(self._backends_list, backend)
+            self._go_to_path(hit.path)
 
     def _show_error(self, error):
         error_str = misc.word_wrap_text(str(error), 70)
         error_str =f"An error has occurred:\n\n{error_str}"
         self._show_text_popup(error_str)
 
+    def _show_service_info(self, *_):
+        service = self._services_list.current_item
+        if not service:
+            return
+        info = f"{ansi.BOLD}{service.name}{ansi.RESET}\n\nURL: {service.url}\n"
+        if service.connect_time is not None:
+            info += f"Connect time: {service.connect_time * 1000:.0f}ms\n"
+        info += f"Connection pool size: {service.pool_size}\n"
+        stats = service.connection_stats
+        if stats:
+            info += (
+                f"Requests: {stats['requests']}\n"
+                f"New connections: {stats['new_connections']}\n"
+                f"Reused connections: {stats['reused_connections']}\n"
+                f"Throttled answers: {stats['throttled']}, "
+                f"{stats['retried']} retried\n"
+                f"Circuit breaker: {stats['circuit']}\n"
+            )
+        self._show_text_popup(info)
+
+    def _show_metrics(self, *_):
+        if not self._metrics:
+            self._show_text_popup("Metrics are disabled")
+            return
+        text = (
+            f"{ansi.BOLD}Latency in milliseconds{ansi.RESET}\n\n"
+            "http: time until vault answers, other operations include\n"
+            "the time spent by the client.\n\n"
+        )
+        flights = self._vault_model.flights
+        text += self._metrics.report()
+        text += (
+            f"\n\nReads joined to one in flight: {flights.coalesced} of "
+            f"{flights.calls} ({flights.ratio:.1%})"
+        )
+        for service_name, stats in self._prefetcher.stats.items():
+            text += (
+                f"\nPrefetch hits on {service_name}: {stats.hits} of "
+                f"{stats.hits + stats.misses} ({stats.hit_rate:.1%}), "
+                f"{stats.prefetched} prefetched"
+            )
+        self._show_text_popup(text)
+
+    def dump_metrics(self):
+        """
+        Writes collected metrics as json to the file set as metrics_file.
+        """
+        if self._metrics and self._metrics_file:
+            try:
+                self._metrics.dump(os.path.expanduser(self._metrics_file))
+            except Exception as e:
+                logging.error(f"Unable to write metrics {e}")
+
+    def close(self):
+        """
+        Stops background work and closes files kept open.
+        """
+        self._vault_model.close()
+        if self._highlighter:
+            self._highlighter.close()
+        if self._vault_model.names:
+            self._vault_model.names.close()
+
     def _show_help(self, *_):
         self._show_text_popup(texts.HELP)
 
@@ -354,24 +911,55 @@ class VaultBrowser(Application):
             logging.warn(f'Unable to remove tempfile {e}')
 
 
-    def _show_text_popup(self, text):    
-        max_height, max_width = ansi.terminal_size()    
-    
-        popup_width = int(max_width * 0.75)    
-        popup_height = int(max_height * 0.75)    
-    
-        rect = Rect(    
-            int((max_width - popup_width) / 2),    
-            int((max_height - popup_height) / 2),    
-            popup_width,    
-            popup_height,    
-        )    
-        text_view = TextView(rect=rect, text=text)    
-        self.open_popup(text_view) 
+    def _popup_rect(self):
+        max_height, max_width = ansi.terminal_size()
+
+        popup_width = int(max_width * 0.75)
+        popup_height = int(max_height * 0.75)
+
+        return Rect(
+            int((max_width - popup_width) / 2),
+            int((max_height - popup_height) / 2),
+            popup_width,
+            popup_height,
+        )
+
+    def _show_text_popup(self, text):
+        text_view = TextView(rect=self._popup_rect(), text=text)
+        self.open_popup(text_view)
+
+def _setup_logging(config_dir):
+    parser = configparser.ConfigParser()
+    parser.read(os.path.join(config_dir, "vaultbrowser.ini"))
+    log_file = parser["DEFAULT"].get("log_file", "vaultbrowser.log")
+    log_level = parser["DEFAULT"].get("log_level", "debug").upper()
+    level = logging.getLevelName(log_level)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    if log_file:
+        logging.basicConfig(
+            filename=os.path.expanduser(log_file),
+            format="%(message)s",
+            level=level if isinstance(level, int) else logging.INFO,
+        )
+        if not isinstance(level, int):
+            logging.warning(f"Unknown log_level {log_level}, logging at INFO")
+    else:
+        # Keeps logging from falling back to writing on the terminal
+        root.addHandler(logging.NullHandler())
+
 
 def main():
+    _setup_logging(misc.config_dir())
+    if len(sys.argv) > 1:
+        sys.exit(cli.main(sys.argv[1:]))
     explorer = VaultBrowser()
-    explorer.main_loop()
+    try:
+        explorer.main_loop()
+    finally:
+        explorer.dump_metrics()
+        explorer.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,156 @@
+from contextlib import contextmanager
+import threading
+import math
+import json
+import time
+
+# Bucket bounds grow by about 12% each, from 1 microsecond up
+_BUCKETS_PER_DECADE = 20
+_MIN_SECONDS = 1e-6
+
+
+class Histogram:
+    """
+    Latency histogram with logarithmic buckets, keeps constant memory
+    no matter how many times are added.
+    """
+    def __init__(self):
+        self._buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        bucket = 0
+        if seconds > _MIN_SECONDS:
+            bucket = int(math.log10(seconds / _MIN_SECONDS) * _BUCKETS_PER_DECADE)
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """
+        Returns the upper bound of the bucket holding the p-th percentile,
+        never above the maximum time added.
+        """
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                upper = _MIN_SECONDS * 10 ** ((bucket + 1) / _BUCKETS_PER_DECADE)
+                return min(upper, self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class OperationStats:
+    """
+    Times, errors and bytes transferred for one operation.
+    """
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def to_dict(self):
+        return {
+            "count": self.latency.count,
+            "errors": self.errors,
+            "mean_s": self.latency.mean,
+            "p50_s": self.latency.percentile(50),
+            "p95_s": self.latency.percentile(95),
+            "p99_s": self.latency.percentile(99),
+            "max_s": self.latency.max,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+
+class Metrics:
+    """
+    Collects operation statistics by service, mount and operation name.
+    Handler operations are timed as seen by the application, and http
+    requests as seen on the wire, so both can be told apart.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(
+        self,
+        service,
+        mount,
+        operation,
+        seconds,
+        error=False,
+        bytes_sent=0,
+        bytes_received=0,
+    ):
+        key = (service or "", mount or "", operation)
+        with self._lock:
+            stats = self._stats.get(key)
+            if not stats:
+                stats = self._stats[key] = OperationStats()
+            stats.latency.add(seconds)
+            if error:
+                stats.errors += 1
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+
+    @contextmanager
+    def timed(self, service, mount, operation):
+        """
+        Records the time taken by the enclosed block, as an error if it raises.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(service, mount, operation, time.perf_counter() - started, True)
+            raise
+        self.record(service, mount, operation, time.perf_counter() - started)
+
+    def to_dict(self):
+        with self._lock:
+            items = sorted(self._stats.items())
+            result = {}
+            for (service, mount, operation), stats in items:
+                mounts = result.setdefault(service, {})
+                mounts.setdefault(mount, {})[operation] = stats.to_dict()
+            return result
+
+    def report(self):
+        """
+        Returns a plain text table with percentiles in milliseconds.
+        """
+        lines = []
+        header = (
+            f"{'operation':<12}{'count':>8}{'err':>6}"
+            f"{'p50':>9}{'p95':>9}{'p99':>9}{'KiB in':>10}"
+        )
+        for service, mounts in self.to_dict().items():
+            lines.append(f"{service}")
+            for mount, operations in mounts.items():
+                lines.append(f"  {mount or '-'}")
+                lines.append("    " + header)
+                for operation, stats in operations.items():
+                    lines.append(
+                        f"    {operation:<12}{stats['count']:>8}{stats['errors']:>6}"
+                        f"{stats['p50_s'] * 1000:>9.1f}"
+                        f"{stats['p95_s'] * 1000:>9.1f}"
+                        f"{stats['p99_s'] * 1000:>9.1f}"
+                        f"{stats['bytes_received'] / 1024:>10.1f}"
+                    )
+        return "\n".join(lines)
+
+    def dump(self, file_name):
+        with open(file_name, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
@@ -1,4 +1,5 @@
 import tempfile
+import os
 
 
 def word_wrap_text(string, length):
@@ -27,3 +28,16 @@ def make_tempfile(text, format_hint=None):
     tf.write(text)
     tf.flush()
     return tf
+
+
+def open_private(file_name):
+    """
+    Opens a file for writing, readable only by the user when created,
+    for files holding secrets.
+    """
+    fd = os.open(file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    return os.fdopen(fd, "w")
+
+
+def config_dir():
+    return os.path.join(os.environ["HOME"], ".vaultbrowser")
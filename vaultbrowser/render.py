@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from .highlight import iter_colorized, collapsed
+import threading
+
+
+class RenderedValue:
+    """
+    A value being rendered for display. Lines are pulled from the colorizer
+    a page at a time, so big values are only rendered as far as needed.
+    """
+    def __init__(self, pieces, page_lines=500):
+        self._pieces = pieces
+        self._page_lines = page_lines
+        self._lines = []
+        self._partial = ""
+        self._complete = False
+        self._lock = threading.Lock()
+        self.render_more()
+
+    @classmethod
+    def from_text(cls, text, page_lines=500):
+        return cls(iter(text.splitlines(keepends=True)), page_lines)
+
+    @property
+    def complete(self):
+        return self._complete
+
+    def render_more(self):
+        """
+        Renders one more page of lines.
+        """
+        with self._lock:
+            target = len(self._lines) + self._page_lines
+            while len(self._lines) < target and not self._complete:
+                piece = next(self._pieces, None)
+                if piece is None:
+                    self._complete = True
+                    if self._partial:
+                        self._lines.append(self._partial)
+                        self._partial = ""
+                    break
+                *lines, self._partial = (self._partial + piece).split("\n")
+                self._lines.extend(lines)
+
+    @property
+    def text(self):
+        text = "\n".join(self._lines)
+        if not self._complete:
+            text += "\n\n… more lines, press m to show them"
+        return text
+
+
+class RenderCache:
+    """
+    Keeps the latest rendered values, by path, version and whether collapsed
+    entries were expanded. An entry is only used for the same value it was
+    rendered from.
+    """
+    def __init__(self, max_entries=32, page_lines=500):
+        self._max_entries = max_entries
+        self._page_lines = page_lines
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, path, value, expanded=False, highlighter=None):
+        key = (path, _secret_version(value), expanded)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (entry[0] is value or entry[0] == value):
+                self._entries.move_to_end(key)
+                return entry[1]
+        if highlighter:
+            text = highlighter.highlight(value if expanded else collapsed(value))
+            rendered = RenderedValue.from_text(text, self._page_lines)
+        else:
+            rendered = RenderedValue(
+                iter_colorized(value, collapse=not expanded), self._page_lines
+            )
+        with self._lock:
+            self._entries[key] = (value, rendered)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return rendered
+
+    def invalidate(self, path):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                del self._entries[key]
+
+
+def _secret_version(value):
+    """
+    Returns the version of a key/value v2 secret as read, None otherwise.
+    """
+    try:
+        return value["data"]["metadata"]["version"]
+    except (KeyError, TypeError):
+        return None
@@ -1,7 +1,11 @@
 from cdtui import ListenerHandler
+from .vault.scheduler import RequestScheduler, PRIORITY_HIGH, PRIORITY_LOW
+from .session import make_session
+import configparser
 import threading
 import hvac
 import logging
+import time
 
 
 class Service:
@@ -9,21 +13,62 @@ class Service:
     Holds information of a configured vault service. Handles connection process
     asynchronously, so connection status is notified via listeners.
     """
-    def __init__(self, name, url, token, verify_tls):
+    def __init__(
+        self,
+        name,
+        url,
+        token,
+        verify_tls,
+        timeout=30,
+        pool_size=10,
+        retries=2,
+        keepalive=True,
+        metrics=None,
+        prefetch_depth=1,
+        rate_limit=0,
+    ):
         self._on_connect = ListenerHandler(self)
         self._on_connect_error = ListenerHandler(self)
         self._name = name
         self._url = url
         self._token = token
         self._verify_tls = verify_tls
+        self._timeout = timeout
+        self._pool_size = pool_size
+        self._retries = retries
+        self._keepalive = keepalive
+        self._metrics = metrics
+        self._prefetch_depth = prefetch_depth
+        self._rate_limit = rate_limit
+        self._adapter = None
         self._info = None
         self._connection_thread = None
+        self._request = None
         self._client = None
         self._error = None
+        self._connect_time = None
 
-    def connect(self):
-        self._connection_thread = threading.Thread(target=self._do_connect, daemon=True)
-        self._connection_thread.start()
+    def connect(self, scheduler=None, priority=PRIORITY_LOW):
+        """
+        Starts connecting in background, in its own thread or queued in
+        scheduler. Connecting again while queued only updates the priority.
+        """
+        if self.connected:
+            return
+        if self._request and not self._request.done and not self._request.cancelled:
+            if self._request.started or self._request.priority <= priority:
+                return
+            self._request.cancel()
+        elif self._connection_thread and self._connection_thread.is_alive():
+            return
+        self._error = None
+        if scheduler:
+            self._request = scheduler.submit(self._do_connect, priority=priority)
+        else:
+            self._connection_thread = threading.Thread(
+                target=self._do_connect, daemon=True
+            )
+            self._connection_thread.start()
 
     @property
     def on_connect(self):
@@ -35,7 +80,43 @@ class Service:
 
     @property
     def connecting(self):
-        return self._connection_thread.is_alive()
+        if self._request:
+            return not self._request.done and not self._request.cancelled
+        thread = self._connection_thread
+        return thread is not None and thread.is_alive()
+
+    @property
+    def connect_time(self):
+        """
+        Seconds taken by the last successful connection.
+        """
+        return self._connect_time
+
+    @property
+    def url(self):
+        return self._url
+
+    @property
+    def pool_size(self):
+        return self._pool_size
+
+    @property
+    def connection_stats(self):
+        """
+        Counters of requests sent, and new or reused http connections.
+        """
+        return self._adapter.stats if self._adapter else None
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @property
+    def prefetch_depth(self):
+        """
+        Number of neighbours of the highlighted entry read ahead.
+        """
+        return self._prefetch_depth
 
     @property
     def error(self):
@@ -57,15 +138,91 @@ class Service:
         pass
 
     def _do_connect(self):
+        started = time.monotonic()
         try:
             logging.info("Creating connection")
+            session, self._adapter = make_session(
+                self._pool_size,
+                self._retries,
+                self._keepalive,
+                self._metrics,
+                self._name,
+                self._rate_limit,
+            )
             client = hvac.Client(
-                url=self._url, token=self._token, verify=self._verify_tls
+                url=self._url,
+                token=self._token,
+                verify=self._verify_tls,
+                timeout=self._timeout,
+                session=session,
             )
             client.sys.list_mounted_secrets_engines()
+            self._connect_time = time.monotonic() - started
+            self._record_connect(self._connect_time)
             self._client = client
             self._on_connect()
         except Exception as e:
+            if not self._client:
+                self._record_connect(time.monotonic() - started, True)
             logging.error(e)
             self._error = e
             self._on_connect_error(e)
+
+    def _record_connect(self, seconds, error=False):
+        if self._metrics:
+            self._metrics.record(self._name, None, "connect", seconds, error)
+
+
+class ConnectionManager:
+    """
+    Connects services using a bounded number of threads. Services are
+    connected when needed, or in background with the preferred one first.
+    """
+    def __init__(self, max_workers=4):
+        self._scheduler = RequestScheduler(max_workers)
+
+    def connect(self, service, priority=PRIORITY_HIGH):
+        service.connect(self._scheduler, priority)
+
+    def connect_all(self, services, preferred=None):
+        for service in services:
+            self.connect(
+                service, PRIORITY_HIGH if service.name == preferred else PRIORITY_LOW
+            )
+
+
+def read_services(
+    config_file,
+    timeout=10,
+    pool_size=10,
+    metrics=None,
+    prefetch_depth=1,
+    rate_limit=0,
+):
+    """
+    Creates the services configured in a services.ini file, in file order.
+    Each section gives url, token and verify, and optionally timeout,
+    pool_size, retries, keepalive, prefetch_depth and rate_limit, defaults
+    for all but retries and keepalive are taken from the arguments.
+    """
+    parser = configparser.ConfigParser()
+    parser.read(config_file)
+    services = []
+    for service_name in parser.sections():
+        config = parser[service_name]
+        services.append(
+            Service(
+                service_name,
+                config["url"],
+                config["token"],
+                config.get("verify", "false").lower() == "true",
+                float(config.get("timeout", timeout)),
+                int(config.get("pool_size", pool_size)),
+                int(config.get("retries", "2")),
+                config.get("keepalive", "true").lower() == "true",
+                metrics,
+                int(config.get("prefetch_depth", prefetch_depth)),
+                float(config.get("rate_limit", rate_limit)),
+            )
+        )
+    return services
@@ -0,0 +1,215 @@
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.connection import HTTPConnection
+from urllib.parse import urlsplit
+from .vault.throttle import RateLimiter, CircuitBreaker, backoff, is_retried_by_caller
+import email.utils
+import threading
+import requests
+import socket
+import time
+
+# Answers telling the request was not handled and may be sent again:
+# standby not caught up yet, rate limit quota reached, sealed or standby
+_RETRY_STATUSES = {412, 429, 503}
+# Longest wait before a retry, longer ones would hold up a worker
+# needed by other requests, the answer is returned instead
+_MAX_RETRY_WAIT = 2
+
+_KEEPALIVE_OPTIONS = [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+] + [
+    (socket.IPPROTO_TCP, getattr(socket, name), value)
+    for name, value in [("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 15), ("TCP_KEEPCNT", 4)]
+    if hasattr(socket, name)
+]
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    HTTP adapter keeping up to pool_size connections per host alive,
+    and counting how many requests reused an already open connection.
+    When metrics is given, the time until response headers arrive and
+    the bytes sent and received are recorded by mount as "http".
+
+    Every request of a service goes through here, so this is where vault
+    pushing back is dealt with: requests are sent at most rate_limit per
+    second, answers meaning the request wasn't handled are retried up to
+    retries times, after Retry-After or a jittered exponential backoff,
+    and a circuit breaker stops sending for a while once vault fails
+    again and again. Retries wait at most _MAX_RETRY_WAIT seconds, and
+    requests sent within throttle.retried_by_caller are not retried, so
+    bulk writers retry on their own and adapt their concurrency instead.
+    """
+    def __init__(
+        self,
+        pool_size=10,
+        retries=2,
+        keepalive=True,
+        metrics=None,
+        service=None,
+        rate_limit=0,
+        breaker=None,
+    ):
+        self._keepalive = keepalive
+        self._metrics = metrics
+        self._service = service
+        self._retries = retries
+        self._limiter = RateLimiter(rate_limit)
+        self._breaker = breaker or CircuitBreaker()
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._throttled = 0
+        self._retried = 0
+        super().__init__(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            # Only connection failures are retried by urllib3, request may not
+            # be idempotent, answers saying it wasn't handled are retried in send
+            max_retries=Retry(total=retries, connect=retries, read=0, status=0),
+        )
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self._keepalive:
+            kwargs["socket_options"] = (
+                HTTPConnection.default_socket_options + _KEEPALIVE_OPTIONS
+            )
+        super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        for attempt in range(self._retries + 1):
+            if not self._breaker.allow():
+                raise CircuitOpenError(
+                    f"Vault keeps failing, requests paused for "
+                    f"{self._breaker.retry_in:.0f}s",
+                    request=request,
+                )
+            self._limiter.acquire()
+            with self._lock:
+                self._requests += 1
+            try:
+                response = self._send(request, *args, **kwargs)
+            except Exception:
+                self._breaker.failed()
+                raise
+            if response.status_code >= 500:
+                self._breaker.failed()
+            else:
+                self._breaker.succeeded()
+            if response.status_code not in _RETRY_STATUSES:
+                return response
+            with self._lock:
+                self._throttled += 1
+            if attempt == self._retries or is_retried_by_caller():
+                return response
+            wait = _retry_after(response)
+            if wait is not None and wait > _MAX_RETRY_WAIT:
+                # Told to come back later than worth waiting for here
+                return response
+            response.close()
+            if wait is not None:
+                # Told when to come back, no request of this service goes before
+                self._limiter.pause(wait)
+            else:
+                time.sleep(min(_MAX_RETRY_WAIT, backoff(attempt)))
+            with self._lock:
+                self._retried += 1
+
+    def _send(self, request, *args, **kwargs):
+        if not self._metrics:
+            return super().send(request, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            response = super().send(request, *args, **kwargs)
+        except Exception:
+            self._record(request, started, True)
+            raise
+        elapsed = time.perf_counter() - started
+        if kwargs.get("stream"):
+            # Reading the body here would defeat streaming
+            received = int(response.headers.get("Content-Length") or 0)
+        else:
+            # Chunked answers have no Content-Length, the body is read anyway
+            received = len(response.content)
+        self._record(
+            request,
+            started,
+            response.status_code >= 500 or response.status_code == 429,
+            received,
+            elapsed,
+        )
+        return response
+
+    def _record(self, request, started, error, received=0, elapsed=None):
+        self._metrics.record(
+            self._service,
+            _mount_of(request.url),
+            "http",
+            time.perf_counter() - started if elapsed is None else elapsed,
+            error,
+            len(request.body or b""),
+            received,
+        )
+
+    @property
+    def stats(self):
+        """
+        Returns number of requests sent, new connections opened, connections
+        reused, answers telling to come back later, requests retried, and
+        the state of the circuit breaker.
+        """
+        pools = self.poolmanager.pools
+        new_connections = sum(pools[key].num_connections for key in pools.keys())
+        return {
+            "requests": self._requests,
+            "new_connections": new_connections,
+            "reused_connections": max(0, self._requests - new_connections),
+            "throttled": self._throttled,
+            "retried": self._retried,
+            "circuit": self._breaker.state,
+        }
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of sending a request while the circuit breaker is open.
+    """
+
+
+def _retry_after(response):
+    """
+    Seconds to wait given by the Retry-After header of response, as
+    seconds or as a date, None if it has none.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return max(0, seconds)
+
+
+def _mount_of(url):
+    """
+    Returns the first segment of a vault api path, which is the mount
+    name unless mounted below a nested path.
+    """
+    path = urlsplit(url).path
+    if path.startswith("/v1/"):
+        path = path[len("/v1/") :]
+    return path.split("/", 1)[0] + "/"
+
+
+def make_session(
+    pool_size=10, retries=2, keepalive=True, metrics=None, service=None, rate_limit=0
+):
+    session = requests.Session()
+    adapter = PooledAdapter(pool_size, retries, keepalive, metrics, service, rate_limit)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session, adapter
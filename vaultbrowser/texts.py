@@ -11,7 +11,16 @@ Keyboard:
     {ansi.BOLD}d:{ansi.RESET}      Remove current entry.
     {ansi.BOLD}Enter:{ansi.RESET}  Select item on focused view.
     {ansi.BOLD}D:{ansi.RESET}      Delete recursively.
-    {ansi.BOLD}E:{ansi.RESET}      Export current path as shell script.
+    {ansi.BOLD}E:{ansi.RESET}      Export current path as shell script, json lines or dotenv file.
+    {ansi.BOLD}/:{ansi.RESET}      Search a path in current backend.
+    {ansi.BOLD}g:{ansi.RESET}      Search a path in every connected service.
+    {ansi.BOLD}m:{ansi.RESET}      Show more lines of a big value.
+    {ansi.BOLD}x:{ansi.RESET}      Expand collapsed parts of a big value.
+    {ansi.BOLD}i:{ansi.RESET}      Shows connection details of selected service.
+    {ansi.BOLD}v:{ansi.RESET}      Shows the versions kept of selected secret.
+    {ansi.BOLD}s:{ansi.RESET}      Shows latency statistics of vault calls.
+    {ansi.BOLD}=:{ansi.RESET}      Mark current folder, then compare it with another one.
+    {ansi.BOLD}c:{ansi.RESET}      Cancel running export, recursive delete, comparison or global search.
     {ansi.BOLD}Tab:{ansi.RESET}    Cycle focus across views.
     {ansi.BOLD}Esc:{ansi.RESET}    Closes popups if any open, otherwise exits application.
 """
@@ -1,3 +1,4 @@
-from .listmodel import VaultListModel
+from .listmodel import VaultListModel, Placeholder, LOADING
 from .services import ServicesListModel
 from .backends import BackendListModel
+from .search import SearchResultsModel
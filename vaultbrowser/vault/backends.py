@@ -19,6 +19,16 @@ class BackendItem:
         return type_str
 
 
+def list_backends(client):
+    """
+    Returns the secret engines mounted in vault, sorted by name.
+    """
+    info = client.sys.list_mounted_secrets_engines()
+    return sorted(
+        [BackendItem(k, v) for k, v in info["data"].items()], key=lambda x: x.name
+    )
+
+
 class BackendListModel(ListModel):
     """
     Backends list model.
@@ -39,11 +49,7 @@ class BackendListModel(ListModel):
 
     def _update(self):
         if self._client:
-            info = self._client.sys.list_mounted_secrets_engines()
-            self._backends = sorted(
-                [BackendItem(k, v) for k, v in info["data"].items()],
-                key=lambda x: x.name,
-            )
+            self._backends = list_backends(self._client)
         else:
             self._backends = []
         self.notify_list_changed()
@@ -53,3 +59,9 @@ class BackendListModel(ListModel):
 
     def get_item(self, index):
         return self._backends[index]
+
+    def backend_named(self, name):
+        for backend in self._backends:
+            if backend.name == name:
+                return backend
+        return None
@@ -0,0 +1,99 @@
+from collections import OrderedDict
+import threading
+import time
+
+READ = "read"
+LIST = "list"
+DENY = "deny"
+
+
+class CapabilityCache:
+    """
+    Capabilities of tokens on api paths, as told by sys/capabilities-self.
+    Paths are asked for in batches, like every child of a folder just
+    listed, in requests of up to batch_size paths, and answers are kept
+    by token and path for ttl seconds, up to max_entries of them. A
+    folder denied covers every path below it, which is neither asked
+    for nor sent.
+    """
+    def __init__(self, ttl=300, max_entries=100000, batch_size=500):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._batch_size = batch_size
+        self._entries = OrderedDict()
+        # Folders denied by token, with the time they expire
+        self._denied = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def check(self, client, paths):
+        """
+        Returns the capabilities of the token of client on each of paths,
+        asking vault for the ones not known yet.
+        """
+        token = client.token
+        now = time.monotonic()
+        known = {}
+        with self._lock:
+            for path in paths:
+                entry = self._entries.get((token, path))
+                if entry and entry[0] > now:
+                    known[path] = entry[1]
+                elif self._denied_below(token, path, now):
+                    known[path] = [DENY]
+        missing = [p for p in paths if p not in known]
+        for start in range(0, len(missing), self._batch_size):
+            known.update(self._ask(client, missing[start : start + self._batch_size]))
+        return known
+
+    def _ask(self, client, paths):
+        token = client.token
+        result = client.sys.get_capabilities(paths)
+        if hasattr(result, "json"):
+            # Older hvac versions return the raw response
+            result = result.json()
+        data = result.get("data") or result
+        expires = time.monotonic() + self._ttl
+        answers = {}
+        with self._lock:
+            self.requests += 1
+            for path in paths:
+                capabilities = data.get(path, [])
+                self._entries[(token, path)] = (expires, capabilities)
+                self._entries.move_to_end((token, path))
+                if path.endswith("/") and DENY in capabilities:
+                    self._denied[(token, path)] = expires
+                answers[path] = capabilities
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return answers
+
+    def _denied_below(self, token, path, now):
+        end = path.find("/")
+        while 0 <= end < len(path) - 1:
+            expires = self._denied.get((token, path[: end + 1]))
+            if expires is not None:
+                if expires > now:
+                    return True
+                del self._denied[(token, path[: end + 1])]
+            end = path.find("/", end + 1)
+        return False
+
+    def allows(self, client, path, capability):
+        """
+        Returns False only when the token of client is known to lack
+        capability on path or to be denied a folder above it, paths not
+        checked yet are assumed allowed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((client.token, path))
+            if not entry or entry[0] <= now:
+                return not self._denied_below(client.token, path, now)
+        capabilities = entry[1]
+        return capability in capabilities or "root" in capabilities
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._denied.clear()
@@ -0,0 +1,114 @@
+import logging
+import queue
+import threading
+import time
+import traceback
+
+_FOLDER = 0
+_LEAF = 1
+
+
+def join_path(path, key):
+    return "/".join(p for p in [path, key.strip("/")] if p)
+
+
+class Crawler:
+    """
+    Walks the subtree below a path using a bounded pool of threads.
+    Folders and leaves are queued as they are discovered, so leaves are
+    processed in parallel and nothing but paths is kept in memory.
+    """
+    def __init__(self, handler, workers=8):
+        self._handler = handler
+        self._workers = max(1, workers)
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._started = None
+        self._finished = None
+        self.folders = 0
+        self.leaves = 0
+        self.errors = 0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def running(self):
+        return self._started is not None and self._finished is None
+
+    @property
+    def elapsed(self):
+        if not self._started:
+            return 0
+        return (self._finished or time.monotonic()) - self._started
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.leaves / elapsed if elapsed else 0
+
+    def walk(self, path, on_leaf, on_folder=None):
+        """
+        Blocks until the subtree is walked or the crawler is cancelled.
+        on_leaf(path) is invoked for each leaf, and on_folder(path, keys)
+        for each listed folder, both from worker threads. When on_leaf is
+        None leaves are only counted, leaves for which it returns False
+        are not.
+        """
+        self._started = time.monotonic()
+        pending = queue.LifoQueue()
+        pending.put((_FOLDER, path.strip("/")))
+        workers = [
+            threading.Thread(
+                target=self._work, args=(pending, on_leaf, on_folder), daemon=True
+            )
+            for _ in range(self._workers)
+        ]
+        for worker in workers:
+            worker.start()
+        pending.join()
+        for _ in workers:
+            pending.put(None)
+        for worker in workers:
+            worker.join()
+        self._finished = time.monotonic()
+
+    def _work(self, pending, on_leaf, on_folder):
+        while True:
+            item = pending.get()
+            if item is None:
+                pending.task_done()
+                return
+            try:
+                if not self.cancelled:
+                    kind, path = item
+                    if kind == _FOLDER:
+                        self._visit_folder(pending, path, on_leaf, on_folder)
+                    elif on_leaf(path) is not False:
+                        with self._lock:
+                            self.leaves += 1
+            except Exception as e:
+                logging.error(f"{e} - {traceback.format_exc()}")
+                with self._lock:
+                    self.errors += 1
+            finally:
+                pending.task_done()
+
+    def _visit_folder(self, pending, path, on_leaf, on_folder):
+        keys = self._handler.list(path)
+        with self._lock:
+            self.folders += 1
+        if on_folder:
+            on_folder(path, keys)
+        for key in keys:
+            if key.endswith("/"):
+                pending.put((_FOLDER, join_path(path, key)))
+            elif on_leaf:
+                pending.put((_LEAF, join_path(path, key)))
+            else:
+                with self._lock:
+                    self.leaves += 1
@@ -0,0 +1,52 @@
+from cdtui import ListenerHandler
+from .crawler import Crawler
+from .throttle import RateLimiter
+import time
+
+
+class RecursiveDelete:
+    """
+    Deletes every leaf below a path. Leaves are deleted concurrently by
+    at most workers threads, and no more than rate deletes per second
+    are issued when rate is set.
+    """
+    def __init__(self, handler, workers=4, rate=0, progress_interval=0.5):
+        self._on_progress = ListenerHandler(self)
+        self._handler = handler
+        self._crawler = Crawler(handler, workers)
+        self._limiter = RateLimiter(rate)
+        self._progress_interval = progress_interval
+        self._last_progress = 0
+
+    @property
+    def on_progress(self):
+        return self._on_progress
+
+    @property
+    def crawler(self):
+        return self._crawler
+
+    @property
+    def completed(self):
+        return not self._crawler.cancelled and not self._crawler.errors
+
+    def cancel(self):
+        self._crawler.cancel()
+
+    def delete(self, path):
+        def on_leaf(leaf_path):
+            self._limiter.acquire()
+            if self._crawler.cancelled:
+                # Not deleted, so not counted
+                return False
+            self._handler.delete(leaf_path)
+            self._notify_progress()
+
+        self._crawler.walk(path, on_leaf)
+        self._on_progress(self._crawler)
+
+    def _notify_progress(self):
+        now = time.monotonic()
+        if now - self._last_progress >= self._progress_interval:
+            self._last_progress = now
+            self._on_progress(self._crawler)
@@ -0,0 +1,224 @@
+from cdtui import ListenerHandler
+from .crawler import join_path
+from .handler.kv2 import version_of
+import hvac.exceptions
+import logging
+import queue
+import threading
+import time
+import traceback
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+_FOLDER = 0
+_LEAF = 1
+
+_BOTH = 0
+_SOURCE = 1
+_TARGET = 2
+
+
+class TreeDiff:
+    """
+    Compares the subtree below a path of a source handler with the one
+    below a path of a target handler, reporting what differs as seen from
+    the target: entries only in the source are added, entries only in the
+    target are removed, and entries in both with different values are
+    changed.
+
+    Both trees are walked at once by a pool of threads. Listings are
+    compared first, so only leaves found on both sides are read. For
+    backends keeping versions, the versions of leaves found equal are
+    kept in known, and while neither side gets a new version they are
+    compared through metadata without reading values again.
+    """
+    def __init__(self, source, target, workers=8, known=None):
+        self._on_difference = ListenerHandler(self)
+        self._source = source
+        self._target = target
+        self._workers = max(1, workers)
+        self._known = known if known is not None else {}
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._started = None
+        self._finished = None
+        self._source_path = ""
+        self._target_path = ""
+        self.folders = 0
+        self.compared = 0
+        self.by_metadata = 0
+        self.differences = 0
+        self.errors = 0
+
+    @property
+    def on_difference(self):
+        """
+        Called with the kind of difference, the path relative to the
+        compared paths, and the source value when it was read, from
+        worker threads.
+        """
+        return self._on_difference
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def target(self):
+        return self._target
+
+    @property
+    def known(self):
+        return self._known
+
+    @property
+    def running(self):
+        return self._started is not None and self._finished is None
+
+    @property
+    def elapsed(self):
+        if not self._started:
+            return 0
+        return (self._finished or time.monotonic()) - self._started
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def diff(self, source_path, target_path):
+        """
+        Blocks until both subtrees are compared or the diff is cancelled.
+        """
+        self._started = time.monotonic()
+        self._source_path = source_path.strip("/")
+        self._target_path = target_path.strip("/")
+        pending = queue.LifoQueue()
+        pending.put((_FOLDER, "", _BOTH))
+        workers = [
+            threading.Thread(target=self._work, args=(pending,), daemon=True)
+            for _ in range(self._workers)
+        ]
+        for worker in workers:
+            worker.start()
+        pending.join()
+        for _ in workers:
+            pending.put(None)
+        for worker in workers:
+            worker.join()
+        self._finished = time.monotonic()
+
+    def source_path(self, relative):
+        return join_path(self._source_path, relative)
+
+    def target_path(self, relative):
+        return join_path(self._target_path, relative)
+
+    def _work(self, pending):
+        while True:
+            item = pending.get()
+            if item is None:
+                pending.task_done()
+                return
+            try:
+                if not self.cancelled:
+                    kind, relative, sides = item
+                    if kind == _FOLDER:
+                        self._visit_folder(pending, relative, sides)
+                    else:
+                        self._compare(relative)
+            except Exception as e:
+                logging.error(f"{e} - {traceback.format_exc()}")
+                with self._lock:
+                    self.errors += 1
+            finally:
+                pending.task_done()
+
+    def _visit_folder(self, pending, relative, sides):
+        source_keys = set()
+        target_keys = set()
+        if sides != _TARGET:
+            source_keys = _list(self._source, self.source_path(relative))
+        if sides != _SOURCE:
+            target_keys = _list(self._target, self.target_path(relative))
+        with self._lock:
+            self.folders += 1
+        for key in sorted(source_keys | target_keys):
+            if key in source_keys and key in target_keys:
+                key_sides = _BOTH
+            else:
+                key_sides = _SOURCE if key in source_keys else _TARGET
+            path = join_path(relative, key)
+            if key.endswith("/"):
+                pending.put((_FOLDER, path, key_sides))
+            elif key_sides == _BOTH:
+                pending.put((_LEAF, path, key_sides))
+            else:
+                self._report(ADDED if key_sides == _SOURCE else REMOVED, path)
+
+    def _compare(self, relative):
+        source_path = self.source_path(relative)
+        target_path = self.target_path(relative)
+        known = self._known.get(relative)
+        if known:
+            versions = [
+                version_of(self._source.read_metadata(source_path)),
+                version_of(self._target.read_metadata(target_path)),
+            ]
+            if _same_versions(versions, known):
+                with self._lock:
+                    self.compared += 1
+                    self.by_metadata += 1
+                return
+        source_value, source_version = self._source.read_version(source_path)
+        target_value, target_version = self._target.read_version(target_path)
+        with self._lock:
+            self.compared += 1
+        if source_value != target_value:
+            self._known.pop(relative, None)
+            self._report(CHANGED, relative, source_value)
+        elif source_version and target_version:
+            self._known[relative] = [list(source_version), list(target_version)]
+
+    def _report(self, kind, relative, value=None):
+        with self._lock:
+            self.differences += 1
+        try:
+            self._on_difference(kind, relative, value)
+        except Exception as e:
+            logging.error(f"{e} - {traceback.format_exc()}")
+            with self._lock:
+                self.errors += 1
+
+
+def sync(tree_diff, writer, delete=False):
+    """
+    Makes the target of tree_diff match its source while differences are
+    found: added and changed entries are queued in writer, which must write
+    to the target, and removed ones are queued for deletion if delete is set.
+    """
+    def on_difference(_, kind, relative, value):
+        if kind == REMOVED:
+            if delete:
+                writer.put_delete(tree_diff.target_path(relative))
+            return
+        if value is None:
+            value = tree_diff.source.read_value(tree_diff.source_path(relative))
+        writer.put(tree_diff.target_path(relative), value)
+
+    tree_diff.on_difference.add(on_difference)
+
+
+def _list(handler, path):
+    try:
+        return set(handler.list(path) or [])
+    except hvac.exceptions.InvalidPath:
+        return set()
+
+
+def _same_versions(versions, known):
+    return all(versions) and [list(v) for v in versions] == known
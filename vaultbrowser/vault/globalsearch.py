@@ -0,0 +1,161 @@
+from cdtui import ListenerHandler
+from .backends import list_backends
+from .crawler import Crawler, join_path
+from .handler import get_handler
+import logging
+import threading
+import time
+import traceback
+
+# Backends holding paths worth searching
+_SEARCHABLE = {"kv", "generic", "cubbyhole"}
+
+
+class SearchHit:
+    """
+    A path found by a global search, folders end with "/".
+    """
+    def __init__(self, service, backend, path):
+        self.service = service
+        self.backend = backend
+        self.path = path
+
+    def __str__(self):
+        return f"{self.service.name}: {self.backend.name}{self.path}"
+
+
+class GlobalSearch:
+    """
+    Searches paths across every key/value backend of several services
+    at once. Services are searched in parallel, each one by a crawler of
+    up to workers threads walking its backends one after another, so no
+    service gets more than workers requests at a time. A path matches
+    when it contains every whitespace separated term of the query, mount
+    name included. Matches are reported as they are found, and the search
+    stops after limit of them.
+    """
+    def __init__(self, services, workers=4, limit=1000, metrics=None, flights=None):
+        self._on_match = ListenerHandler(self)
+        self._services = services
+        self._workers = max(1, workers)
+        self._limit = limit
+        self._metrics = metrics
+        self._flights = flights
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._crawlers = set()
+        self._started = None
+        self._finished = None
+        self.searched = 0
+        self.folders = 0
+        self.matches = 0
+        self.errors = 0
+
+    @property
+    def on_match(self):
+        """
+        Called with a SearchHit for each match, from crawler threads.
+        """
+        return self._on_match
+
+    @property
+    def services(self):
+        return self._services
+
+    @property
+    def running(self):
+        return self._started is not None and self._finished is None
+
+    @property
+    def elapsed(self):
+        if not self._started:
+            return 0
+        return (self._finished or time.monotonic()) - self._started
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._lock:
+            for crawler in self._crawlers:
+                crawler.cancel()
+
+    def search(self, query):
+        """
+        Blocks until every service is searched or the search is cancelled.
+        """
+        self._started = time.monotonic()
+        terms = query.lower().split()
+        threads = [
+            threading.Thread(
+                target=self._search_service, args=(service, terms), daemon=True
+            )
+            for service in self._services
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._finished = time.monotonic()
+
+    def _search_service(self, service, terms):
+        try:
+            backends = list_backends(service.client)
+        except Exception as e:
+            logging.error(f"Unable to list backends of {service.name}: {e}")
+            with self._lock:
+                self.errors += 1
+            return
+        for backend in backends:
+            if self.cancelled:
+                break
+            if backend.info.get("type") not in _SEARCHABLE:
+                continue
+            handler = get_handler(
+                service.client,
+                backend,
+                cache_ttl=0,
+                metrics=self._metrics,
+                service=service.name,
+                flights=self._flights,
+            )
+            crawler = Crawler(handler, self._workers)
+            with self._lock:
+                if self.cancelled:
+                    break
+                self._crawlers.add(crawler)
+            try:
+                crawler.walk(
+                    "",
+                    None,
+                    lambda path, keys: self._on_listing(
+                        service, backend, terms, path, keys
+                    ),
+                )
+            finally:
+                with self._lock:
+                    self._crawlers.discard(crawler)
+                    self.folders += crawler.folders
+                    self.errors += crawler.errors
+        with self._lock:
+            self.searched += 1
+
+    def _on_listing(self, service, backend, terms, path, keys):
+        for key in keys:
+            hit_path = join_path(path, key) + ("/" if key.endswith("/") else "")
+            full_path = (backend.name + hit_path).lower()
+            if not all(term in full_path for term in terms):
+                continue
+            with self._lock:
+                if self.matches >= self._limit:
+                    return
+                self.matches += 1
+                full = self.matches >= self._limit
+            try:
+                self._on_match(SearchHit(service, backend, hit_path))
+            except Exception as e:
+                logging.error(f"{e} - {traceback.format_exc()}")
+            if full:
+                self.cancel()
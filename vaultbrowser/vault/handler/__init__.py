@@ -1,8 +1,12 @@
-__all__ = [ 'get_handler']
+__all__ = [ 'get_handler', 'FlightGroup']
 
 from .generic import GenericHandler
 from .kv2 import KV2Handler
 from .identity import IdentityHandler
+from .cache import CachingHandler
+from .timing import TimingHandler
+from .singleflight import SingleFlightHandler, FlightGroup
+from .capability import CapabilityHandler
 
 
 class HandlerInfo:
@@ -34,9 +38,36 @@ def _get_handler_type(backend):
     return _HANDLERS[info]
 
 
-def get_handler(client, backend_info):
+def get_handler(
+    client,
+    backend_info,
+    cache_ttl=30,
+    cache_size=1024,
+    metrics=None,
+    service=None,
+    flights=None,
+    capabilities=None,
+    names=None,
+):
     """
     Returns the appropiate handler for a given backend,
     or generic handler if none is suitable.
+    Results are cached for cache_ttl seconds, a value of 0 disables caching.
+    When metrics is given, calls reaching vault are timed under service name.
+    Concurrent reads of the same path are joined, in flights if given.
+    When a CapabilityCache is given, calls known to be forbidden are refused.
+    Identity names are kept in names, a NameStore, if given.
     """
-    return _get_handler_type(backend_info)(client, backend_info)
+    handler_type = _get_handler_type(backend_info)
+    if handler_type is IdentityHandler:
+        handler = IdentityHandler(client, backend_info, names, service)
+    else:
+        handler = handler_type(client, backend_info)
+    if metrics:
+        handler = TimingHandler(handler, metrics, service)
+    handler = SingleFlightHandler(handler, flights, service)
+    if capabilities:
+        handler = CapabilityHandler(handler, capabilities)
+    if cache_ttl > 0:
+        handler = CachingHandler(handler, cache_ttl, cache_size)
+    return handler
@@ -0,0 +1,144 @@
+from .handler import HandlerWrapper
+from collections import OrderedDict
+import threading
+import time
+
+_LIST = "list"
+_READ = "read"
+_READ_VALUE = "read_value"
+_READ_VERSION = "read_version"
+_READ_METADATA = "read_metadata"
+_READ_HISTORY = "read_history"
+# Operations whose result changes when the entry itself is written
+_ENTRY_OPS = [_READ, _READ_VALUE, _READ_VERSION, _READ_METADATA, _READ_HISTORY]
+
+
+def _normalize(path):
+    return path.strip("/")
+
+
+def _split(path):
+    """
+    Splits a normalized path into its parent path and the name the entry
+    has in the parent listing.
+    """
+    if "/" in path:
+        parent, name = path.rsplit("/", 1)
+        return parent, name
+    return "", path
+
+
+class CachingHandler(HandlerWrapper):
+    """
+    Read-through cache for listings, values and metadata. Entries expire
+    after ttl seconds, and the least recently used ones are dropped
+    when more than max_entries are held.
+    Writes and deletes invalidate only the entries they affect.
+    """
+    def __init__(self, handler, ttl=30, max_entries=1024):
+        super().__init__(handler)
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def read(self, path):
+        return self._cached(_READ, path, self._handler.read)
+
+    def read_value(self, path):
+        return self._cached(_READ_VALUE, path, self._handler.read_value)
+
+    def read_version(self, path):
+        return self._cached(_READ_VERSION, path, self._handler.read_version)
+
+    def read_metadata(self, path):
+        return self._cached(_READ_METADATA, path, self._handler.read_metadata)
+
+    def read_history(self, path):
+        return self._cached(_READ_HISTORY, path, self._handler.read_history)
+
+    def list(self, path):
+        return self._cached(_LIST, path, self._handler.list)
+
+    def write(self, path, value):
+        try:
+            return self._handler.write(path, value)
+        finally:
+            self._invalidate_written(_normalize(path))
+
+    def delete(self, path):
+        try:
+            return self._handler.delete(path)
+        finally:
+            self._invalidate_deleted(_normalize(path))
+
+    def forget(self, path):
+        path = _normalize(path)
+        with self._lock:
+            self._generation += 1
+            for op in [_LIST] + _ENTRY_OPS:
+                self._entries.pop((op, path), None)
+        self._handler.forget(path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def _cached(self, op, path, fetch):
+        key = (op, _normalize(path))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+            generation = self._generation
+
+        value = fetch(path)
+
+        with self._lock:
+            # Something got invalidated meanwhile, the value may be stale.
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self._ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def _invalidate_written(self, path):
+        with self._lock:
+            self._generation += 1
+            for op in _ENTRY_OPS:
+                self._entries.pop((op, path), None)
+            parent, name = _split(path)
+            while True:
+                listing = self._entries.get((_LIST, parent))
+                if listing and name in listing[1]:
+                    # Parent already knew this entry, nothing changes upwards.
+                    break
+                self._entries.pop((_LIST, parent), None)
+                if not parent:
+                    break
+                parent, name = _split(parent)
+                name += "/"
+
+    def _invalidate_deleted(self, path):
+        with self._lock:
+            self._generation += 1
+            prefix = path + "/"
+            for key in [
+                k for k in self._entries if k[1] == path or k[1].startswith(prefix)
+            ]:
+                del self._entries[key]
+            parent, name = _split(path)
+            while True:
+                listing = self._entries.pop((_LIST, parent), None)
+                if not parent or not listing or list(listing[1]) != [name]:
+                    # Parent still has other entries, so it doesn't vanish.
+                    break
+                parent, name = _split(parent)
+                name += "/"
@@ -0,0 +1,41 @@
+from .handler import HandlerWrapper
+from ..capabilities import READ, LIST
+import hvac.exceptions
+
+
+class CapabilityHandler(HandlerWrapper):
+    """
+    Refuses reads and listings the token is known not to be allowed,
+    as checked beforehand in a CapabilityCache, without sending them.
+    Paths not checked yet go through.
+    """
+    def __init__(self, handler, capabilities):
+        super().__init__(handler)
+        self._capabilities = capabilities
+
+    def _check(self, path, leaf):
+        capability_path = self._handler.capability_path(path, leaf)
+        if capability_path and not self._capabilities.allows(
+            self._client, capability_path, READ if leaf else LIST
+        ):
+            raise hvac.exceptions.Forbidden(f"permission denied on {capability_path}")
+
+    def read(self, path):
+        self._check(path, True)
+        return self._handler.read(path)
+
+    def read_value(self, path):
+        self._check(path, True)
+        return self._handler.read_value(path)
+
+    def read_version(self, path):
+        self._check(path, True)
+        return self._handler.read_version(path)
+
+    def read_value_at(self, path, version):
+        self._check(path, True)
+        return self._handler.read_value_at(path, version)
+
+    def list(self, path):
+        self._check(path, False)
+        return self._handler.list(path)
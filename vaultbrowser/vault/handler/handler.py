@@ -28,3 +28,123 @@ class BackendHandler(metaclass=ABCMeta):
     def delete(self, path):
         pass
 
+    def read_version(self, path):
+        """
+        Returns the value at path and its version, the version is None
+        for backends not keeping versions.
+        """
+        return self.read_value(path), None
+
+    def read_metadata(self, path):
+        """
+        Returns the version metadata of path, None for backends
+        not keeping versions.
+        """
+        return None
+
+    @property
+    def versioned(self):
+        """
+        True for backends keeping versions of values.
+        """
+        return False
+
+    def read_history(self, path):
+        """
+        Returns the versions kept of path newest first, as dicts with
+        version, created_time, deletion_time, destroyed and current.
+        Empty for backends not keeping versions.
+        """
+        return []
+
+    def read_value_at(self, path, version):
+        """
+        Returns the value path had at a version given by read_history,
+        only for versioned backends.
+        """
+        raise ValueError(f"{self._backend_info.name} keeps no versions")
+
+    def capability_path(self, path, leaf=True):
+        """
+        Returns the api path whose read capability, or list capability
+        for folders, is needed to open path. None if it can't be told.
+        """
+        path = path.strip("/")
+        return self._backend_info.name + path + ("" if leaf or not path else "/")
+
+    def display_name(self, path):
+        """
+        Returns a readable name for an entry whose name is an opaque id,
+        None if there's nothing better than its name.
+        """
+        return None
+
+    def forget(self, path):
+        """
+        Drops anything kept in memory about path, so the next call
+        for it reaches vault.
+        """
+        pass
+
+    def close(self):
+        """
+        Stops background work, the handler is no longer used.
+        """
+        pass
+
+
+class HandlerWrapper(BackendHandler):
+    """
+    Base class for handlers which decorate another handler,
+    all calls are forwarded to the wrapped one.
+    """
+    def __init__(self, handler):
+        super().__init__(handler._client, handler._backend_info)
+        self._handler = handler
+
+    @property
+    def handler(self):
+        return self._handler
+
+    def write(self, path, value):
+        return self._handler.write(path, value)
+
+    def read(self, path):
+        return self._handler.read(path)
+
+    def read_value(self, path):
+        return self._handler.read_value(path)
+
+    def list(self, path):
+        return self._handler.list(path)
+
+    def delete(self, path):
+        return self._handler.delete(path)
+
+    def read_version(self, path):
+        return self._handler.read_version(path)
+
+    def read_metadata(self, path):
+        return self._handler.read_metadata(path)
+
+    @property
+    def versioned(self):
+        return self._handler.versioned
+
+    def read_history(self, path):
+        return self._handler.read_history(path)
+
+    def read_value_at(self, path, version):
+        return self._handler.read_value_at(path, version)
+
+    def capability_path(self, path, leaf=True):
+        return self._handler.capability_path(path, leaf)
+
+    def display_name(self, path):
+        return self._handler.display_name(path)
+
+    def forget(self, path):
+        return self._handler.forget(path)
+
+    def close(self):
+        return self._handler.close()
@@ -1,14 +1,63 @@
 from .handler import BackendHandler
-from pathlib import PurePath
+from ..names import NameStore
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import logging
 
+# Folders listing ids, and the api path they're listed at
+_ID_FOLDERS = {
+    "entity": "entity/id",
+    "entity-alias": "entity-alias/id",
+    "group": "group/id",
+    "group-alias": "group-alias/id",
+}
+_OIDC_FOLDERS = {
+    "oidc/key": "oidc/key",
+    "oidc/role": "oidc/role",
+}
+# Most ids whose names are read by one task and stored together
+_BATCH_SIZE = 50
+
 
 class IdentityHandler(BackendHandler):
     """
     Handler for identity backend
+
+    Entities, groups and their aliases are listed by id, their names are
+    taken from the key_info of the listing and kept in a NameStore. Names
+    missing there are read in background by up to workers threads, and
+    stored in batches so the view is refreshed once per batch.
     """
+    def __init__(self, client, backend_info, names=None, service=None, workers=8):
+        super().__init__(client, backend_info)
+        self._names = names or NameStore()
+        # Part of the key names are stored by, unnamed outside of a service
+        self._service = service or ""
+        self._workers = workers
+        self._resolver = None
+        self._resolving = set()
+        self._lock = threading.Lock()
+
+    def _api_path(self, path, leaf=True):
+        """
+        Returns the api path of a path of the tree, None for the folders
+        made up here.
+        """
+        path = path.strip("/")
+        if not leaf:
+            return _ID_FOLDERS.get(path) or _OIDC_FOLDERS.get(path)
+        folder, _, name = path.rpartition("/")
+        if folder in _ID_FOLDERS:
+            return f"{_ID_FOLDERS[folder]}/{name}"
+        if folder in _OIDC_FOLDERS:
+            return f"{_OIDC_FOLDERS[folder]}/{name}"
+        return None
+
     def _real_path(self, path):
-        return str(PurePath(self._backend_info.name, path))
+        api_path = self._api_path(path)
+        if not api_path:
+            raise ValueError(f"No such identity entry: {path}")
+        return self._backend_info.name + api_path
 
     def read(self, path):
         return self._client.read(self._real_path(path))
@@ -16,36 +65,82 @@ class IdentityHandler(BackendHandler):
     def read_value(self, path):
         return self.read(path)
 
+    def capability_path(self, path, leaf=True):
+        api_path = self._api_path(path, leaf)
+        return self._backend_info.name + api_path if api_path else None
+
+    def display_name(self, path):
+        folder, _, id = path.strip("/").rpartition("/")
+        if folder in _ID_FOLDERS:
+            return self._names.name(self._service, folder, id)
+        return None
+
     def list(self, path):
         logging.info(f"list {path}")
-        if path in ["", "/"]:
-            return [
-                "entity/",
-                "entity-alias/",
-                "group/",
-                "group-alias/",
-                "token/",
-                "lookup/",
-            ]
-        elif path == "entity/":
-            entry = self._client.secrets.identity.list_entities()
-        elif path == "entity-alias/":
-            entry = self._client.secrets.identity.list_entity_aliases()
-        elif path == "group/":
-            entry = client.secrets.identity.list_groups()
-        elif path == "group-alias/":
-            entry = client.secrets.identity.list_group_aliases()
-        elif path == "token/":
-            entry = None
-        elif path == "lookup/":
-            entry = None
-        else:
-            entry = None
-
-        return (entry or {}).get("data", {}).get("keys", [])
+        path = path.strip("/")
+        if not path:
+            return ["entity/", "entity-alias/", "group/", "group-alias/", "oidc/"]
+        if path == "oidc":
+            return ["key/", "role/"]
+        api_path = self._api_path(path, False)
+        if not api_path:
+            return []
+        entry = self._client.list(self._backend_info.name + api_path)
+        data = (entry or {}).get("data", {})
+        keys = data.get("keys", [])
+        if path in _ID_FOLDERS:
+            key_info = data.get("key_info") or {}
+            self._names.update(
+                self._service,
+                path,
+                {id: (info or {}).get("name") for id, info in key_info.items()},
+            )
+            self._resolve(path, self._names.missing(self._service, path, keys))
+        return keys
 
     def write(self, path, data):
-        self._client.write(self._real_path(path), data)
+        self._client.write(self._real_path(path), **data)
 
     def delete(self, path):
         self._client.delete(self._real_path(path))
+
+    def close(self):
+        with self._lock:
+            resolver, self._resolver = self._resolver, None
+        if resolver:
+            # Lookups still queued are not worth waiting for
+            resolver.shutdown(wait=False)
+
+    def _resolve(self, kind, ids):
+        with self._lock:
+            ids = [i for i in ids if (kind, i) not in self._resolving]
+            if not ids:
+                return
+            self._resolving.update((kind, i) for i in ids)
+            if self._resolver is None:
+                self._resolver = ThreadPoolExecutor(self._workers)
+            # Stored, and shown, a batch at a time rather than name by name
+            size = min(_BATCH_SIZE, -(-len(ids) // self._workers))
+            for start in range(0, len(ids), size):
+                self._resolver.submit(
+                    self._resolve_names, kind, ids[start : start + size]
+                )
+
+    def _resolve_names(self, kind, ids):
+        names = {}
+        try:
+            for id in ids:
+                try:
+                    result = self._client.read(
+                        f"{self._backend_info.name}{_ID_FOLDERS[kind]}/{id}"
+                    )
+                    names[id] = ((result or {}).get("data") or {}).get("name")
+                except Exception as e:
+                    logging.warning(f"Unable to read the name of {kind} {id}: {e}")
+            if names:
+                self._names.update(self._service, kind, names)
+        except Exception as e:
+            logging.warning(f"Unable to store names of {kind}: {e}")
+        finally:
+            with self._lock:
+                self._resolving.difference_update((kind, i) for i in ids)
@@ -1,24 +1,110 @@
-import logging
+import threading
+import hvac.exceptions
+from collections import OrderedDict
 from .handler import BackendHandler
 
 
+def version_of(metadata):
+    """
+    Returns the current version of a secret metadata as the version number
+    and its creation time, same as read_version gives.
+    """
+    if not metadata:
+        return None
+    current = metadata["current_version"]
+    created = metadata["versions"].get(str(current), {}).get("created_time")
+    return current, created
+
+
+def history_of(metadata):
+    """
+    Returns the versions listed in a secret metadata, newest first,
+    same as read_history gives.
+    """
+    if not metadata:
+        return []
+    current = metadata["current_version"]
+    history = []
+    for version, info in metadata["versions"].items():
+        history.append(
+            {
+                "version": int(version),
+                "created_time": info.get("created_time"),
+                "deletion_time": info.get("deletion_time") or None,
+                "destroyed": bool(info.get("destroyed")),
+                "current": int(version) == current,
+            }
+        )
+    return sorted(history, key=lambda v: v["version"], reverse=True)
+
+
+def _readable(metadata):
+    """
+    Current version of a secret metadata, None if it was deleted.
+    """
+    info = metadata["versions"].get(str(metadata["current_version"]), {})
+    if info.get("deletion_time") or info.get("destroyed"):
+        return None
+    return metadata["current_version"]
+
+
 class KV2Handler(BackendHandler):
     """
     Handler for Key/Value V.2 backend
+
+    Versions never change once written, so bodies read are kept by
+    version, up to max_bodies of them. Reading a secret again checks its
+    metadata first, and the body is only fetched when a new version was
+    written since.
     """
+    def __init__(self, client, backend_info, max_bodies=1024):
+        super().__init__(client, backend_info)
+        self._max_bodies = max_bodies
+        self._bodies = OrderedDict()
+        # Current version and update time last seen by path
+        self._current = OrderedDict()
+        self._lock = threading.Lock()
+        # Policies often grant data/ but not metadata/, known once refused
+        self._metadata_allowed = True
+
+    @property
+    def versioned(self):
+        return True
+
     @property
     def _mount_point(self):
         return self._backend_info.name
 
+    def current_version(self, path):
+        """
+        Returns the current version of path and the time it was updated,
+        as last seen, or None if path wasn't read yet.
+        """
+        with self._lock:
+            return self._current.get(path.strip("/"))
+
     def write(self, path, value):
         self._client.secrets.kv.v2.create_or_update_secret(
             mount_point=self._mount_point, path=path, secret=value
         )
 
     def read(self, path):
-        return self._client.secrets.kv.v2.read_secret_version(
-            mount_point=self._mount_point, path=path
-        )
+        path = path.strip("/")
+        if not self._metadata_allowed or self.current_version(path) is None:
+            return self._read_body(path)
+        try:
+            metadata = self.read_metadata(path)
+        except hvac.exceptions.Forbidden:
+            self._metadata_allowed = False
+            return self._read_body(path)
+        except hvac.exceptions.InvalidPath:
+            return self._read_body(path)
+        version = _readable(metadata)
+        if version is not None:
+            body = self._body(path, version)
+            if body is not None:
+                return body
+        return self._read_body(path, version)
 
     def read_value(self, path):
         value = self.read(path)
@@ -26,6 +112,39 @@ class KV2Handler(BackendHandler):
             return value['data']['data']
         return value
 
+    def read_version(self, path):
+        value = self.read(path)
+        if not value:
+            return value, None
+        metadata = value["data"]["metadata"]
+        return value["data"]["data"], (metadata["version"], metadata["created_time"])
+
+    def read_metadata(self, path):
+        result = self._client.secrets.kv.v2.read_secret_metadata(
+            mount_point=self._mount_point, path=path
+        )
+        metadata = result["data"]
+        self._track(
+            path.strip("/"), metadata["current_version"], metadata.get("updated_time")
+        )
+        return metadata
+
+    def read_history(self, path):
+        return history_of(self.read_metadata(path))
+
+    def read_value_at(self, path, version):
+        path = path.strip("/")
+        body = self._body(path, version)
+        if body is None:
+            body = self._read_body(path, version)
+        return body["data"]["data"]
+
+    def capability_path(self, path, leaf=True):
+        path = path.strip("/")
+        if leaf:
+            return f"{self._mount_point}data/{path}"
+        return f"{self._mount_point}metadata/" + (f"{path}/" if path else "")
+
     def list(self, path):
         result = self._client.secrets.kv.v2.list_secrets(
             mount_point=self._mount_point, path=path
@@ -36,3 +155,35 @@ class KV2Handler(BackendHandler):
         self._client.secrets.kv.v2.delete_metadata_and_all_versions(
             mount_point=self._mount_point, path=path
         )
+        path = path.strip("/")
+        with self._lock:
+            self._current.pop(path, None)
+            for key in [k for k in self._bodies if k[0] == path]:
+                del self._bodies[key]
+
+    def _read_body(self, path, version=None):
+        result = self._client.secrets.kv.v2.read_secret_version(
+            mount_point=self._mount_point, path=path, version=version
+        )
+        metadata = result["data"]["metadata"]
+        with self._lock:
+            self._bodies[(path, metadata["version"])] = result
+            while len(self._bodies) > self._max_bodies:
+                self._bodies.popitem(last=False)
+        if version is None:
+            self._track(path, metadata["version"], metadata.get("created_time"))
+        return result
+
+    def _body(self, path, version):
+        with self._lock:
+            body = self._bodies.get((path, version))
+            if body is not None:
+                self._bodies.move_to_end((path, version))
+            return body
+
+    def _track(self, path, version, updated):
+        with self._lock:
+            self._current[path] = (version, updated)
+            self._current.move_to_end(path)
+            while len(self._current) > self._max_bodies:
+                self._current.popitem(last=False)
@@ -0,0 +1,136 @@
+from .handler import HandlerWrapper
+import threading
+
+_OPERATIONS = [
+    "list",
+    "read",
+    "read_value",
+    "read_version",
+    "read_metadata",
+    "read_history",
+]
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class FlightGroup:
+    """
+    Keeps track of the reads in flight, so a read of something already
+    being read waits for that request instead of sending its own.
+    Can be shared by several handlers, reads are told apart by service,
+    mount, operation and path.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    @property
+    def ratio(self):
+        """
+        Fraction of calls answered by a request already in flight.
+        """
+        return self.coalesced / self.calls if self.calls else 0
+
+    def do(self, key, fetch):
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fetch()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def forget(self, service, mount, path):
+        """
+        Calls for path made from now on won't join reads already in flight.
+        """
+        with self._lock:
+            for operation in _OPERATIONS:
+                self._flights.pop((service, mount, operation, path), None)
+
+
+class SingleFlightHandler(HandlerWrapper):
+    """
+    Joins concurrent reads of the same path into a single request.
+    Writes and deletes go straight through, and later reads of the
+    path they change send a new request.
+    """
+    def __init__(self, handler, group=None, service=None):
+        super().__init__(handler)
+        self._group = group or FlightGroup()
+        self._service = service
+        self._mount = handler._backend_info.name
+
+    @property
+    def group(self):
+        return self._group
+
+    def _do(self, operation, path, fetch):
+        key = (self._service, self._mount, operation, path.strip("/"))
+        return self._group.do(key, lambda: fetch(path))
+
+    def read(self, path):
+        return self._do("read", path, self._handler.read)
+
+    def read_value(self, path):
+        return self._do("read_value", path, self._handler.read_value)
+
+    def read_version(self, path):
+        return self._do("read_version", path, self._handler.read_version)
+
+    def read_metadata(self, path):
+        return self._do("read_metadata", path, self._handler.read_metadata)
+
+    def read_history(self, path):
+        return self._do("read_history", path, self._handler.read_history)
+
+    def list(self, path):
+        return self._do("list", path, self._handler.list)
+
+    def write(self, path, value):
+        try:
+            return self._handler.write(path, value)
+        finally:
+            self._changed(path)
+
+    def delete(self, path):
+        try:
+            return self._handler.delete(path)
+        finally:
+            self._changed(path)
+
+    def forget(self, path):
+        self._group.forget(self._service, self._mount, path.strip("/"))
+        return self._handler.forget(path)
+
+    def _changed(self, path):
+        # The listing of the parent may change as well
+        path = path.strip("/")
+        self._group.forget(self._service, self._mount, path)
+        self._group.forget(self._service, self._mount, path.rpartition("/")[0])
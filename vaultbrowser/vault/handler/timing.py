@@ -0,0 +1,52 @@
+from .handler import HandlerWrapper
+
+
+class TimingHandler(HandlerWrapper):
+    """
+    Records the time taken by every call of the wrapped handler,
+    and whether it failed, in a Metrics instance.
+    """
+    def __init__(self, handler, metrics, service=None):
+        super().__init__(handler)
+        self._metrics = metrics
+        self._service = service
+        self._mount = handler._backend_info.name
+
+    def _timed(self, operation):
+        return self._metrics.timed(self._service, self._mount, operation)
+
+    def write(self, path, value):
+        with self._timed("write"):
+            return self._handler.write(path, value)
+
+    def read(self, path):
+        with self._timed("read"):
+            return self._handler.read(path)
+
+    def read_value(self, path):
+        with self._timed("read_value"):
+            return self._handler.read_value(path)
+
+    def read_version(self, path):
+        with self._timed("read_version"):
+            return self._handler.read_version(path)
+
+    def read_metadata(self, path):
+        with self._timed("metadata"):
+            return self._handler.read_metadata(path)
+
+    def read_history(self, path):
+        with self._timed("history"):
+            return self._handler.read_history(path)
+
+    def read_value_at(self, path, version):
+        with self._timed("read_value_at"):
+            return self._handler.read_value_at(path, version)
+
+    def list(self, path):
+        with self._timed("list"):
+            return self._handler.list(path)
+
+    def delete(self, path):
+        with self._timed("delete"):
+            return self._handler.delete(path)
@@ -0,0 +1,154 @@
+from array import array
+import bisect
+import threading
+
+
+def _trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class PathIndex:
+    """
+    In-memory index of the paths of a backend, answering prefix and
+    substring queries without talking to vault, ignoring case.
+    Paths are kept in an array sorted by their lowercase form for prefix
+    lookups, sorted again on search after paths were added, and trigram
+    postings (sorted arrays of path ids) kept up to date as paths are
+    added narrow down substring lookups. Queries too short for trigrams
+    only match by prefix. Folder paths end with "/".
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = []
+        self._lower_paths = []
+        self._ids = {}
+        self._postings = {}
+        # (lowercase path, path) pairs
+        self._sorted = []
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, path):
+        return path in self._ids
+
+    def add(self, path):
+        with self._lock:
+            self._add(path)
+
+    def add_listing(self, path, keys):
+        """
+        Adds the entries of a folder listing.
+        """
+        prefix = path.strip("/")
+        prefix = prefix + "/" if prefix else ""
+        with self._lock:
+            if prefix:
+                self._add(prefix)
+            for key in keys:
+                self._add(prefix + key)
+
+    def remove(self, path):
+        """
+        Removes a path and, for folders, everything below it.
+        """
+        lower = path.lower()
+        with self._lock:
+            self._ensure_sorted()
+            start = bisect.bisect_left(self._sorted, (lower,))
+            end = start
+            kept = []
+            while end < len(self._sorted) and self._sorted[end][0].startswith(lower):
+                entry = self._sorted[end][1]
+                if entry == path or (path.endswith("/") and entry.startswith(path)):
+                    path_id = self._ids.pop(entry, None)
+                    if path_id is not None:
+                        self._paths[path_id] = None
+                else:
+                    # Differs in case, or only shares a prefix
+                    kept.append(self._sorted[end])
+                end += 1
+            self._sorted[start:end] = kept
+
+    def search(self, query, limit=50):
+        """
+        Returns up to limit paths, those starting with query first, then
+        those containing every whitespace separated term of query.
+        """
+        terms = query.lower().split()
+        if not terms:
+            return []
+        with self._lock:
+            self._ensure_sorted()
+            results = self._prefix_matches(query.strip().lower(), limit)
+            if len(results) < limit:
+                seen = set(results)
+                for path in self._substring_matches(terms):
+                    if path not in seen:
+                        results.append(path)
+                        if len(results) >= limit:
+                            break
+        return results
+
+    def _add(self, path):
+        if path in self._ids:
+            return
+        path_id = len(self._paths)
+        lower = path.lower()
+        self._paths.append(path)
+        # Share the string when it's lowercase already
+        self._lower_paths.append(path if lower == path else lower)
+        self._ids[path] = path_id
+        self._sorted.append((self._lower_paths[path_id], path))
+        self._dirty = True
+        all_postings = self._postings
+        for trigram in _trigrams(lower):
+            postings = all_postings.get(trigram)
+            if postings is None:
+                postings = all_postings[trigram] = array("I")
+            postings.append(path_id)
+
+    def _ensure_sorted(self):
+        if self._dirty:
+            self._sorted.sort()
+            self._dirty = False
+
+    def _prefix_matches(self, prefix, limit):
+        results = []
+        index = bisect.bisect_left(self._sorted, (prefix,))
+        while (
+            index < len(self._sorted)
+            and len(results) < limit
+            and self._sorted[index][0].startswith(prefix)
+        ):
+            results.append(self._sorted[index][1])
+            index += 1
+        return results
+
+    def _substring_matches(self, terms):
+        postings = {}
+        for term in terms:
+            for trigram in _trigrams(term):
+                trigram_postings = self._postings.get(trigram)
+                if trigram_postings is None:
+                    return
+                postings[trigram] = trigram_postings
+        if not postings:
+            # Terms too short for trigrams, prefix matches are all there is
+            return
+        postings = sorted(postings.values(), key=len)
+        paths = self._paths
+        lower_paths = self._lower_paths
+        for path_id in postings[0]:
+            if not all(_contains(other, path_id) for other in postings[1:]):
+                continue
+            lower = lower_paths[path_id]
+            if all(term in lower for term in terms) and paths[path_id] is not None:
+                yield paths[path_id]
+
+
+def _contains(postings, path_id):
+    # Ids are appended in increasing order, so postings are sorted
+    index = bisect.bisect_left(postings, path_id)
+    return index < len(postings) and postings[index] == path_id
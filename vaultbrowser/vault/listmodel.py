@@ -1,18 +1,57 @@
-from cdtui import ListModel
+from cdtui import ListModel, ListenerHandler
 import logging
 import traceback
 import hvac
 import os
-from .handler import get_handler
+import sys
+import threading
+import time
+from collections import OrderedDict
+from .handler import get_handler, FlightGroup
+from .scheduler import RequestScheduler, PRIORITY_HIGH, PRIORITY_LOW
+from .delete import RecursiveDelete
+from .crawler import Crawler
+from .index import PathIndex
+from .capabilities import CapabilityCache, READ, LIST
+
+
+class Placeholder:
+    """
+    Non selectable row shown in place of the children of a node
+    while they are being listed, or when listing failed.
+    """
+    def __init__(self, text):
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+
+LOADING = Placeholder("loading\u2026")
 
 
 class Node:
+    # Large mounts hold hundreds of thousands of nodes, keep them small.
+    __slots__ = (
+        "_model",
+        "_parent",
+        "_name",
+        "_path",
+        "_children",
+        "_request",
+        "_error",
+        "_stale",
+    )
+
     def __init__(self, model, parent, name):
         self._model = model
         self._parent = parent
-        self._name = name
+        self._name = sys.intern(name)
+        self._path = None
         self._children = None  # if name and name[-1] == "/" else []
-        logging.info(f"Path:{self.path}")
+        self._request = None
+        self._error = None
+        self._stale = False
 
     @property
     def child_count(self):
@@ -20,28 +59,131 @@ class Node:
 
     @property
     def path(self):
-        path = []
-        node = self
-        while node:
-            if node.name:
-                path.append(node.name.replace("/", ""))
-            node = node.parent
-
-        return "/".join(reversed(path))
+        if self._path is None:
+            name = self._name.replace("/", "")
+            parent_path = self._parent.path if self._parent else ""
+            self._path = f"{parent_path}/{name}" if parent_path else name
+        return self._path
 
     @property
     def children(self):
-        try:
+        """
+        Children of this node, an empty list if they are not listed yet,
+        in that case listing is scheduled in background. Failed listings
+        are retried only when load() is called explicitly.
+        """
+        if self._children is None:
+            if self._error is None:
+                self.load()
+            return []
+        return self._children
+
+    @property
+    def loaded(self):
+        return self._children is not None
+
+    @property
+    def loading(self):
+        return self._request is not None
+
+    @property
+    def error(self):
+        return self._error
+
+    @property
+    def stale(self):
+        """
+        True when children come from a snapshot and were not listed again yet.
+        """
+        return self._stale
+
+    def load(self, priority=PRIORITY_HIGH):
+        if self._request is None and (self._children is None or self._stale):
+            handler = self._model._handler
+            path = self.path
             if self._children is None:
-                children = []
-                result = self._model._handler.list(self.path)
-                self._children = sorted(
-                    [Node(self._model, self, i) for i in result], key=lambda x: x.name
-                )
-            return self._children
-        except Exception as e:
-            logging.error(f"{e} - {traceback.format_exc()}")
-            return self._children
+                keys = self._model._snapshot_listing(path)
+                if keys is not None:
+                    self._set_children(keys)
+                    self._stale = True
+                    self._model._on_node_loaded(self, False)
+            if self._stale:
+                # Listing is already on screen, revalidate it quietly
+                priority = max(priority, PRIORITY_LOW)
+            self._error = None
+            self._request = self._model.scheduler.submit(
+                lambda: handler.list(path),
+                self._on_loaded,
+                self._on_load_error,
+                priority,
+            )
+        return self._request
+
+    def refresh(self):
+        """
+        Lists children again in background if they were listed already,
+        only what changed is applied.
+        """
+        if self._request is None and self._children is not None:
+            handler = self._model._handler
+            path = self.path
+
+            def relist():
+                handler.forget(path)
+                return handler.list(path)
+
+            self._request = self._model.scheduler.submit(
+                relist,
+                self._on_refreshed,
+                self._on_refresh_error,
+                PRIORITY_LOW,
+            )
+        return self._request
+
+    def cancel_load(self):
+        if self._request:
+            self._request.cancel()
+            self._request = None
+
+    def _set_children(self, keys):
+        # Nodes already known are kept, so are their listed subtrees
+        with self._model.lock:
+            existing = {c.name: c for c in self._children or []}
+            self._children = [
+                existing.get(i) or Node(self._model, self, i) for i in sorted(keys)
+            ]
+
+    def _on_loaded(self, result):
+        self._set_children(result)
+        self._stale = False
+        self._request = None
+        self._model._on_node_loaded(self)
+
+    def _on_refreshed(self, result):
+        self._request = None
+        keys = sorted(result)
+        with self._model.lock:
+            # Merged under the lock the view reads rows with
+            names = [c.name for c in self._children or []]
+            if keys == names:
+                return
+            kept = set(keys)
+            removed = [c for c in self._children if c.name not in kept]
+            known = set(names)
+            self._set_children(keys)
+            added = [c for c in self._children if c.name not in known]
+            self._stale = False
+        self._model._on_node_refreshed(self, added, removed)
+
+    def _on_refresh_error(self, error):
+        # Keeps showing what was listed, next refresh will try again
+        self._request = None
+        logging.warning(f"Unable to refresh {self.path}: {error}")
+
+    def _on_load_error(self, error):
+        self._error = error
+        self._request = None
+        self._model._on_node_loaded(self, False)
 
     def get_value(self):
         return self._model._handler.read(self.path)
@@ -70,34 +212,93 @@ class Node:
     def __str__(self):
         return self.name
 
-    def remove(self, recursively):
-        self._model._handler.delete(self.path)
+    def remove(self, recursively=False, deleter=None):
+        if recursively and not self.leaf:
+            deleter = deleter or RecursiveDelete(self._model._handler)
+            deleter.delete(self.path)
+        else:
+            self._model._handler.delete(self.path)
+
+    def reset(self):
+        """
+        Forgets listed children, they'll be listed again when needed.
+        """
+        self.cancel_load()
+        self._children = None
+        self._error = None
 
     def add_child(self, name, data):
         new_path = "/".join([self.path, name])
         logging.info(f"New path:{new_path}, value:{data}")
         self._model._handler.write(new_path, data)
-        self._children.append(Node(self._model, self, name))
+        if self._children is not None:
+            with self._model.lock:
+                self._children.append(Node(self._model, self, name))
+            self._model._save_snapshot(self)
+            self._model._track(self)
+        self._model.index.add(new_path.strip("/"))
         self._model.notify_list_changed()
 
+    def child_named(self, name):
+        """
+        Returns the child with the given name, the trailing slash of folders
+        is optional. If children are not listed yet the node is made up.
+        """
+        for child in self._children or []:
+            if child.name in (name, name + "/"):
+                return child
+        return Node(self._model, self, name)
+
+    @property
+    def root(self):
+        node = self
+        while node.parent:
+            node = node.parent
+        return node
+
 class VaultListModel(ListModel):
     """
     List model for vault contents.
     This model works pretty much like a tree navigator.
     """
-    def __init__(self):
+    def __init__(self, scheduler=None):
         super().__init__()
+        self._on_node_listed = ListenerHandler(self)
+        self._on_current_refreshed = ListenerHandler(self)
+        # Guards the children of nodes, changed from worker threads
+        self._lock = threading.RLock()
+        self._scheduler = scheduler or RequestScheduler()
         self._client = None
         self._handler = None
         self._backend = None
         self._root = None
         self._current = None
+        self._index = None
+        self._index_crawler = None
+        self.cache_ttl = 30
+        self.cache_size = 1024
+        self.snapshots = None
+        self.refresh_interval = 0
+        self._refresh_thread = None
+        self.service_name = None
+        self.metrics = None
+        # Reads in flight, shared by the handlers of every backend
+        self.flights = FlightGroup()
+        # Capabilities of the token on listed paths, shared as well
+        self.capabilities = CapabilityCache()
+        self.check_capabilities = True
+        self._names = None
+        self.node_budget = 200000
+        # Listed folders, least recently visited first, with their child count
+        self._listed = OrderedDict()
+        self._node_count = 0
+        self._listed_lock = threading.RLock()
 
     def set_client(self, client):
         old_client, self._client = self._client, client
         if old_client == client:
             self._backend = None
-            self._handler = None
+            self.close()
         self._update()
 
     def get_client(self):
@@ -105,10 +306,71 @@ class VaultListModel(ListModel):
 
     client = property(get_client, set_client)
 
+    @property
+    def scheduler(self):
+        return self._scheduler
+
+    @property
+    def on_node_listed(self):
+        """
+        Called with each node of the current backend once its listing
+        ended, failed or not, from worker threads.
+        """
+        return self._on_node_listed
+
+    @property
+    def on_current_refreshed(self):
+        """
+        Called when a refresh changed the children of the current folder,
+        from worker threads, before the view is notified.
+        """
+        return self._on_current_refreshed
+
+    @property
+    def lock(self):
+        return self._lock
+
+    @property
+    def names(self):
+        """
+        NameStore keeping names of identity entries, the view is notified
+        when names of the current service arrive.
+        """
+        return self._names
+
+    @names.setter
+    def names(self, names):
+        self._names = names
+        if names:
+            names.on_update.add(self._on_names_updated)
+
+    def _on_names_updated(self, _, service, kind):
+        if service == self.service_name and self._handler:
+            self.notify_list_changed()
+
+    def close(self):
+        """
+        Stops background work of the handler in use, if any.
+        """
+        if self._handler:
+            self._handler.close()
+            self._handler = None
+
     def set_backend(self, backend):
+        self.close()
         if backend:
             self._backend = backend
-            self._handler = get_handler(self._client, backend)
+            self._handler = get_handler(
+                self._client,
+                backend,
+                self.cache_ttl,
+                self.cache_size,
+                self.metrics,
+                self.service_name,
+                self.flights,
+                self.capabilities if self.check_capabilities else None,
+                self._names,
+            )
         else:
             self._backend = None
             self._handler = None
@@ -119,11 +381,48 @@ class VaultListModel(ListModel):
 
     backend = property(get_backend, set_backend)
 
+    @property
+    def handler(self):
+        return self._handler
+
+    @property
+    def index(self):
+        return self._index
+
+    def build_index(self, workers=8):
+        """
+        Starts listing the whole backend in background to fill the path index.
+        Returns the crawler doing it, or the one already running.
+        """
+        if self._handler and not self._index_crawler:
+            index = self._index
+            crawler = self._index_crawler = Crawler(self._handler, workers)
+            threading.Thread(
+                target=crawler.walk,
+                args=("", None, index.add_listing),
+                daemon=True,
+            ).start()
+        return self._index_crawler
+
     def _update(self):
         try:
+            if self._current:
+                self._current.cancel_load()
+            if self._index_crawler:
+                self._index_crawler.cancel()
+                self._index_crawler = None
+            self._index = PathIndex()
+            with self._listed_lock:
+                self._listed.clear()
+                self._node_count = 0
             if self._handler:
                 self._root = Node(self, None, "")
                 self._current = self._root
+                self._root.load()
+                if self.snapshots:
+                    threading.Thread(
+                        target=self._index_snapshot, args=(self._index,), daemon=True
+                    ).start()
             else:
                 self._root = None
                 self._current = None
@@ -137,31 +436,265 @@ class VaultListModel(ListModel):
     def get_current(self):
         return self._current
 
-    def remove_child(self, item, recursively=False):
-        item.remove(recursively)
-        self._current.children.remove(item)
+    @property
+    def node_count(self):
+        return self._node_count
+
+    def remove_child(self, item, recursively=False, deleter=None):
+        item.remove(recursively, deleter)
+        self._forget(item)
+        if deleter and not deleter.completed:
+            # Some entries are left, what remains will be listed again
+            with self._lock:
+                item.reset()
+        else:
+            # Deletes may run in background while the view reads rows
+            with self._lock:
+                parent = item.parent
+                if parent.loaded and item in parent.children:
+                    parent._children = [c for c in parent.children if c is not item]
+                    self._track(parent)
+            self._index.remove(item.path + ("" if item.leaf else "/"))
+            if self.snapshots:
+                self.snapshots.forget(self.service_name, self._backend.name, item.path)
+                self._save_snapshot(item.parent)
         self.notify_list_changed()
 
     def go_to(self, node):
-        self._current = node
-        self.notify_list_changed()
+        self._set_current(node)
 
     def go_up(self):
-        self._current = self._current.parent
+        self._set_current(self._current.parent)
+
+    def _set_current(self, node):
+        previous, self._current = self._current, node
+        if previous is not node:
+            # Listing of the directory we're leaving is no longer needed
+            previous.cancel_load()
+        with self._listed_lock:
+            ancestor = node
+            while ancestor:
+                if ancestor in self._listed:
+                    self._listed.move_to_end(ancestor)
+                ancestor = ancestor.parent
+        node.load()
         self.notify_list_changed()
 
+    def _track(self, node):
+        """
+        Accounts the children of a listed node, and drops the children of
+        the least recently visited folders if over node_budget.
+        """
+        with self._listed_lock:
+            count = len(node.children)
+            self._node_count += count - self._listed.pop(node, 0)
+            self._listed[node] = count
+            if not self.node_budget or self._node_count <= self.node_budget:
+                return
+            current_path = set()
+            ancestor = self._current
+            while ancestor:
+                current_path.add(ancestor)
+                ancestor = ancestor.parent
+            for candidate in list(self._listed):
+                if self._node_count <= self.node_budget:
+                    break
+                if candidate not in current_path and candidate in self._listed:
+                    logging.info(f"Evicting {candidate.path}")
+                    self._forget(candidate)
+                    candidate.reset()
+
+    def _forget(self, node):
+        """
+        Stops accounting a node and the listed nodes below it.
+        """
+        with self._listed_lock:
+            pending = [node]
+            while pending:
+                node = pending.pop()
+                count = self._listed.pop(node, None)
+                if count is not None:
+                    self._node_count -= count
+                    pending.extend(node._children or [])
+
+    def go_to_path(self, path):
+        """
+        Navigates to the folder of a path, folders end with "/".
+        Returns the node of the path.
+        """
+        node = self._root
+        names = path.split("/")
+        for i, name in enumerate(names):
+            if name:
+                node = node.child_named(name if i == len(names) - 1 else name + "/")
+        self.go_to(node if not node.leaf else node.parent)
+        return node
+
+    def _on_node_loaded(self, node, listed=True):
+        if node.root is not self._root:
+            return
+        if node.loaded:
+            self._index.add_listing(node.path, [c.name for c in node.children])
+            if listed:
+                self._save_snapshot(node)
+                self._check_capabilities(node, node.children)
+            self._track(node)
+        if node is self._current:
+            self.notify_list_changed()
+        if listed or node.error:
+            self._on_node_listed(node)
+
+    def _on_node_refreshed(self, node, added, removed):
+        if node.root is not self._root:
+            return
+        for child in removed:
+            self._forget(child)
+            self._index.remove(child.path + ("" if child.leaf else "/"))
+            if self.snapshots and not child.leaf:
+                self.snapshots.forget(self.service_name, self._backend.name, child.path)
+        self._index.add_listing(node.path, [c.name for c in added])
+        self._save_snapshot(node)
+        self._check_capabilities(node, added)
+        self._track(node)
+        if node is self._current:
+            self._on_current_refreshed()
+            self.notify_list_changed()
+
+    def _check_capabilities(self, node, children):
+        """
+        Asks in a single request which of the children can be opened,
+        the view is updated if node is still shown.
+        """
+        handler, client = self._handler, self._client
+        if not self.check_capabilities or not handler or not children:
+            return
+        paths = [handler.capability_path(c.path, c.leaf) for c in children]
+        paths = [p for p in paths if p]
+        if not paths:
+            return
+
+        def on_checked(_):
+            if node is self._current:
+                self.notify_list_changed()
+
+        def on_error(error):
+            # Nothing is refused then, requests fail as they would anyway
+            logging.warning(f"Unable to check capabilities below {node.path}: {error}")
+
+        self._scheduler.submit(
+            lambda: self.capabilities.check(client, paths), on_checked, on_error
+        )
+
+    def display_name(self, node):
+        """
+        Returns a readable name for node when its name is an opaque id.
+        """
+        return self._handler.display_name(node.path) if self._handler else None
+
+    def allowed(self, node):
+        """
+        Returns False when the token is known not to be allowed to read
+        node, or to list it for folders.
+        """
+        handler = self._handler
+        if not self.check_capabilities or not handler:
+            return True
+        path = handler.capability_path(node.path, node.leaf)
+        return not path or self.capabilities.allows(
+            self._client, path, READ if node.leaf else LIST
+        )
+
+    def refresh(self):
+        """
+        Lists again the current folder and its ancestors in background,
+        the view is notified only if the current folder changed.
+        """
+        node = self._current
+        while node:
+            node.refresh()
+            node = node.parent
+
+    def start_refresh(self):
+        """
+        Starts refreshing every refresh_interval seconds, if set.
+        """
+        if self.refresh_interval > 0 and not self._refresh_thread:
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_loop, daemon=True
+            )
+            self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"{e} - {traceback.format_exc()}")
+
+    def _snapshot_listing(self, path):
+        if self.snapshots:
+            try:
+                return self.snapshots.listing(
+                    self.service_name, self._backend.name, path
+                )
+            except Exception as e:
+                logging.error(f"{e} - {traceback.format_exc()}")
+        return None
+
+    def _save_snapshot(self, node):
+        if self.snapshots and node.loaded:
+            try:
+                self.snapshots.save_listing(
+                    self.service_name,
+                    self._backend.name,
+                    node.path,
+                    [c.name for c in node.children],
+                )
+            except Exception as e:
+                logging.error(f"{e} - {traceback.format_exc()}")
+
+    def _index_snapshot(self, index):
+        try:
+            for path, keys in self.snapshots.listings(
+                self.service_name, self._backend.name
+            ):
+                index.add_listing(path, keys)
+        except Exception as e:
+            logging.error(f"{e} - {traceback.format_exc()}")
+
     @property
     def in_root(self):
         return self._current == self._root
 
+    def row_of(self, name):
+        """
+        Returns the row of the child of the current folder with a name,
+        or None.
+        """
+        with self._lock:
+            for index, child in enumerate(self._current._children or []):
+                if child.name == name:
+                    return index + (0 if self.in_root else 1)
+        return None
+
     def get_item_count(self):
-        if self._root:
-            return self._current.child_count + (0 if self.in_root else 1)
-        return 0
+        with self._lock:
+            if self._root:
+                count = self._current.child_count if self._current.loaded else 1
+                return count + (0 if self.in_root else 1)
+            return 0
 
     def get_item(self, index):
-        if not self.in_root:
-            if index == 0:
-                return ".."
-            index -= 1
-        return self._current.children[index]
+        with self._lock:
+            if not self.in_root:
+                if index == 0:
+                    return ".."
+                index -= 1
+            if not self._current.loaded:
+                if self._current.error:
+                    return Placeholder(f"error: {self._current.error}")
+                return LOADING
+            children = self._current.children
+            # Rows counted before a refresh changed them
+            return children[index] if index < len(children) else LOADING
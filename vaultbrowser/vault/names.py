@@ -0,0 +1,81 @@
+from cdtui import ListenerHandler
+import threading
+import sqlite3
+
+
+class NameStore:
+    """
+    Keeps the names of identity entities, groups and their aliases by
+    service, kind and id, on disk so they show up right away on next
+    launch. Names of a kind are loaded in memory on first use. Ids found
+    to have no name are stored with an empty one, so they are not looked
+    up again.
+    """
+    def __init__(self, file_name=":memory:"):
+        self._on_update = ListenerHandler(self)
+        self._lock = threading.Lock()
+        self._loaded = {}
+        self._connection = sqlite3.connect(file_name, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS names ("
+                "service TEXT, kind TEXT, id TEXT, name TEXT, "
+                "PRIMARY KEY (service, kind, id)) WITHOUT ROWID"
+            )
+
+    @property
+    def on_update(self):
+        """
+        Called with service and kind when names were stored, from the
+        thread storing them.
+        """
+        return self._on_update
+
+    def _names(self, service, kind):
+        names = self._loaded.get((service, kind))
+        if names is None:
+            rows = self._connection.execute(
+                "SELECT id, name FROM names WHERE service=? AND kind=?",
+                (service, kind),
+            ).fetchall()
+            names = self._loaded[(service, kind)] = dict(rows)
+        return names
+
+    def name(self, service, kind, id):
+        """
+        Returns the name stored for an id, or None.
+        """
+        with self._lock:
+            return self._names(service, kind).get(id) or None
+
+    def missing(self, service, kind, ids):
+        """
+        Returns the ids with no name stored, not even an empty one.
+        """
+        with self._lock:
+            names = self._names(service, kind)
+            return [i for i in ids if i not in names]
+
+    def update(self, service, kind, names):
+        """
+        Stores names given by id, only the ones that changed are written.
+        Missing names are stored empty.
+        """
+        with self._lock:
+            known = self._names(service, kind)
+            changed = [
+                (i, n or "") for i, n in names.items() if known.get(i) != (n or "")
+            ]
+            if not changed:
+                return
+            known.update(changed)
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO names VALUES (?, ?, ?, ?)",
+                    [(service, kind, i, n) for i, n in changed],
+                )
+        self._on_update(service, kind)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,214 @@
+from .scheduler import PRIORITY_LOW
+from collections import OrderedDict
+import threading
+import json
+
+
+class PrefetchStats:
+    """
+    Counts how often selected entries were already prefetched.
+    """
+    def __init__(self):
+        self.prefetched = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        used = self.hits + self.misses
+        return self.hits / used if used else 0
+
+
+class Prefetcher:
+    """
+    Reads ahead, at low priority, what's around the highlighted entry:
+    the listing of folders and the value of leaves, for the highlighted
+    one and depth neighbours on each side. At most max_requests reads
+    run at once, so user requests always find free workers, and no more
+    than max_bytes of prefetched values are kept. Reads still queued
+    when the highlight moves away are cancelled. Folders are listed by
+    their own node, as when opened, at low priority.
+    """
+    def __init__(self, model, depth=1, max_requests=2, max_bytes=1 << 20):
+        self._model = model
+        self._lock = threading.RLock()
+        self._wanted = []
+        self._requests = {}
+        self._failed = set()
+        # Prefetched values by node, oldest first, with their size
+        self._values = OrderedDict()
+        self._bytes = 0
+        self._prefetched_folders = set()
+        self._stats = {}
+        self.depth = depth
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.service_name = None
+        model.on_node_listed.add(self._on_listed)
+
+    @property
+    def stats(self):
+        """
+        Statistics by service name.
+        """
+        return self._stats
+
+    def _service_stats(self):
+        stats = self._stats.get(self.service_name)
+        if not stats:
+            stats = self._stats[self.service_name] = PrefetchStats()
+        return stats
+
+    def focus(self, nodes, index):
+        """
+        Prefetches around nodes[index], the highlighted entry of nodes.
+        """
+        wanted = []
+        if self.depth > 0:
+            for distance in range(self.depth + 1):
+                for i in [index + distance, index - distance][: 1 + bool(distance)]:
+                    if 0 <= i < len(nodes):
+                        wanted.append(nodes[i])
+        with self._lock:
+            self._wanted = wanted
+            keep = set(wanted)
+            for node, request in list(self._requests.items()):
+                if node not in keep and not request.started:
+                    self._cancel(node, request)
+                    del self._requests[node]
+            # Values are dropped once out of reach, so they don't get old
+            for node in [n for n in self._values if n not in keep]:
+                _, size = self._values.pop(node)
+                self._bytes -= size
+        self._pump()
+
+    def clear(self):
+        """
+        Cancels pending reads and drops prefetched values.
+        """
+        with self._lock:
+            for node, request in self._requests.items():
+                self._cancel(node, request)
+            self._requests.clear()
+            self._wanted = []
+            self._values.clear()
+            self._bytes = 0
+            self._prefetched_folders.clear()
+            self._failed.clear()
+
+    def take(self, node):
+        """
+        Returns the prefetched value of a selected leaf, or None. Accounts
+        the selection as a hit or a miss.
+        """
+        with self._lock:
+            entry = self._values.pop(node, None)
+            request = self._requests.pop(node, None)
+            if request and not request.started:
+                # Will be read right away with higher priority
+                request.cancel()
+            if entry:
+                self._bytes -= entry[1]
+            self._count(entry is not None)
+            return entry[0] if entry else None
+
+    def entered(self, node):
+        """
+        Accounts a selected folder as a hit if its listing was prefetched.
+        """
+        with self._lock:
+            request = self._requests.pop(node, None)
+            if request and not request.started:
+                # Listed again right away with higher priority
+                self._cancel(node, request)
+            hit = node in self._prefetched_folders and node.loaded
+            self._prefetched_folders.discard(node)
+            self._count(hit)
+
+    def forget(self, node):
+        """
+        Drops what was prefetched of node, once written or deleted.
+        """
+        with self._lock:
+            entry = self._values.pop(node, None)
+            if entry:
+                self._bytes -= entry[1]
+            request = self._requests.pop(node, None)
+            if request:
+                self._cancel(node, request)
+            self._prefetched_folders.discard(node)
+            self._failed.discard(node)
+
+    def _cancel(self, node, request):
+        if node.leaf:
+            request.cancel()
+        else:
+            # Owned by the node, which would otherwise never list again
+            node.cancel_load()
+
+    def _count(self, hit):
+        stats = self._service_stats()
+        if hit:
+            stats.hits += 1
+        else:
+            stats.misses += 1
+
+    def _pump(self):
+        with self._lock:
+            for node in self._wanted:
+                if len(self._requests) >= self.max_requests:
+                    return
+                if node in self._requests or node in self._values:
+                    continue
+                if node in self._failed:
+                    continue
+                handler = self._model.handler
+                if not handler:
+                    continue
+                if not node.leaf:
+                    if not node.loaded and not node.loading:
+                        self._requests[node] = node.load(PRIORITY_LOW)
+                    continue
+                if self._bytes >= self.max_bytes:
+                    continue
+                path = node.path
+                self._requests[node] = self._model.scheduler.submit(
+                    lambda path=path: handler.read(path),
+                    lambda result, node=node: self._on_fetched(node, result),
+                    lambda error, node=node: self._on_failed(node),
+                    PRIORITY_LOW,
+                )
+
+    def _on_fetched(self, node, value):
+        with self._lock:
+            if self._requests.pop(node, None) is None:
+                return
+            self._service_stats().prefetched += 1
+            self._keep_value(node, value)
+        self._pump()
+
+    def _on_listed(self, _, node):
+        with self._lock:
+            if self._requests.pop(node, None) is None:
+                return
+            if node.error:
+                self._failed.add(node)
+            else:
+                self._service_stats().prefetched += 1
+                self._prefetched_folders.add(node)
+        self._pump()
+
+    def _on_failed(self, node):
+        # Not tried again, failures are left for the user request to report
+        with self._lock:
+            if self._requests.pop(node, None) is not None:
+                self._failed.add(node)
+        self._pump()
+
+    def _keep_value(self, node, value):
+        size = len(json.dumps(value, default=str))
+        self._values[node] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._values) > 1:
+            _, (_, dropped) = self._values.popitem(last=False)
+            self._bytes -= dropped
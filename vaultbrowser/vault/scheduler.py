@@ -0,0 +1,107 @@
+import itertools
+import logging
+import queue
+import threading
+import traceback
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class Request:
+    """
+    A unit of work queued in a RequestScheduler. Can be cancelled
+    while waiting, in which case its callbacks are never invoked.
+    """
+    def __init__(self, priority, seq, fn, on_done, on_error):
+        self.priority = priority
+        self._seq = seq
+        self._fn = fn
+        self._on_done = on_done
+        self._on_error = on_error
+        self._cancelled = False
+        self._started = False
+        self._done = False
+
+    def __lt__(self, other):
+        return (self.priority, self._seq) < (other.priority, other._seq)
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    @property
+    def started(self):
+        return self._started
+
+    @property
+    def done(self):
+        return self._done
+
+    def run(self):
+        if self._cancelled:
+            return
+        self._started = True
+        try:
+            result = self._fn()
+        except Exception as e:
+            logging.error(f"{e} - {traceback.format_exc()}")
+            self._done = True
+            if not self._cancelled and self._on_error:
+                self._on_error(e)
+            return
+        self._done = True
+        if not self._cancelled and self._on_done:
+            self._on_done(result)
+
+
+class RequestScheduler:
+    """
+    Runs blocking vault calls on a bounded pool of worker threads,
+    picking pending requests by priority (lower value first).
+    Workers are started on demand.
+    """
+    def __init__(self, max_workers=4):
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._idle = 0
+        self.max_workers = max_workers
+
+    def submit(self, fn, on_done=None, on_error=None, priority=PRIORITY_NORMAL):
+        request = Request(priority, next(self._seq), fn, on_done, on_error)
+        self._queue.put(request)
+        self._ensure_worker()
+        return request
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if (
+                self._idle >= self._queue.qsize()
+                or len(self._workers) >= self.max_workers
+            ):
+                return
+            worker = threading.Thread(target=self._work, daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+            request = self._queue.get()
+            with self._lock:
+                self._idle -= 1
+            try:
+                request.run()
+            finally:
+                self._queue.task_done()
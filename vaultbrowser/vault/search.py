@@ -0,0 +1,32 @@
+from cdtui import ListModel
+
+
+class SearchResultsModel(ListModel):
+    """
+    List model for paths found by a search.
+    """
+    def __init__(self, results=None):
+        super().__init__()
+        self._results = results if results is not None else []
+
+    def set_results(self, results):
+        self._results = results
+        self.notify_list_changed()
+
+    def get_results(self):
+        return self._results
+
+    results = property(get_results, set_results)
+
+    def add_result(self, result):
+        """
+        Appends a result as it is found.
+        """
+        self._results.append(result)
+        self.notify_list_changed()
+
+    def get_item_count(self):
+        return len(self._results)
+
+    def get_item(self, index):
+        return self._results[index]
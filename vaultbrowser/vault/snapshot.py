@@ -0,0 +1,62 @@
+import threading
+import sqlite3
+import json
+import time
+
+
+class SnapshotStore:
+    """
+    Keeps on disk the folder listings seen for each service and backend,
+    so they can be shown right away on next launch while vault is asked
+    again in background. Only paths are stored, never values.
+    """
+    def __init__(self, file_name):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(file_name, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS listings ("
+                "service TEXT, mount TEXT, path TEXT, keys TEXT, listed_at REAL, "
+                "PRIMARY KEY (service, mount, path)) WITHOUT ROWID"
+            )
+
+    def listing(self, service, mount, path):
+        """
+        Returns the keys stored for a folder, or None if it was never listed.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT keys FROM listings WHERE service=? AND mount=? AND path=?",
+                (service, mount, path),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def listings(self, service, mount):
+        """
+        Returns (path, keys) for every folder stored for a backend.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT path, keys FROM listings WHERE service=? AND mount=?",
+                (service, mount),
+            ).fetchall()
+        return [(path, json.loads(keys)) for path, keys in rows]
+
+    def save_listing(self, service, mount, path, keys):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?)",
+                (service, mount, path, json.dumps(keys), time.time()),
+            )
+
+    def forget(self, service, mount, path):
+        """
+        Drops the listings of a folder and everything below it.
+        """
+        prefix = path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM listings WHERE service=? AND mount=? "
+                "AND (path=? OR path LIKE ? ESCAPE '\\')",
+                (service, mount, path, prefix + "/%"),
+            )
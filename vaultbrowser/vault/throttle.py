@@ -0,0 +1,189 @@
+import contextlib
+import threading
+import random
+import time
+
+_local = threading.local()
+
+
+def backoff(attempt, base=0.1, maximum=10):
+    """
+    Seconds to wait before retrying for the given attempt, starting at 0:
+    exponential backoff with jitter, so clients throttled together
+    don't come back together.
+    """
+    return min(maximum, base * 2 ** attempt) * random.uniform(0.5, 1)
+
+
+@contextlib.contextmanager
+def retried_by_caller():
+    """
+    Within, requests sent by the current thread that vault answers it
+    couldn't handle are not retried by the session, the caller retries
+    and backs off on its own.
+    """
+    previous = getattr(_local, "retried_by_caller", False)
+    _local.retried_by_caller = True
+    try:
+        yield
+    finally:
+        _local.retried_by_caller = previous
+
+
+def is_retried_by_caller():
+    return getattr(_local, "retried_by_caller", False)
+
+
+class RateLimiter:
+    """
+    Token bucket allowing up to rate operations per second, with bursts
+    of up to burst operations. A rate of 0 means no limit. Operations
+    can also be held back for a while with pause, whatever the rate.
+    """
+    def __init__(self, rate=0, burst=None):
+        self._rate = rate
+        self._burst = burst or max(1, rate)
+        self._tokens = self._burst
+        self._last = time.monotonic()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def pause(self, seconds):
+        """
+        Holds back every operation for the next seconds.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._rate <= 0:
+                        return
+                    self._tokens = min(
+                        self._burst, self._tokens + (now - self._last) * self._rate
+                    )
+                    self._last = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+class AdaptiveLimit:
+    """
+    Limits how many operations run at once, adjusting the limit AIMD
+    style: it grows by one after a limit's worth of successes, and is
+    halved when the server pushes back, never going below 1 or above
+    maximum. Operations running together are usually pushed back
+    together, so the limit is halved at most once every window seconds.
+    """
+    def __init__(self, maximum, initial=None, window=1.0):
+        self._maximum = max(1, maximum)
+        self._limit = float(min(initial or self._maximum, self._maximum))
+        self._window = window
+        self._decreased = None
+        self._running = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def maximum(self):
+        return self._maximum
+
+    def acquire(self):
+        with self._condition:
+            while self._running >= int(self._limit):
+                self._condition.wait()
+            self._running += 1
+
+    def release(self, throttled=False):
+        with self._condition:
+            self._running -= 1
+            if throttled:
+                now = time.monotonic()
+                if self._decreased is None or now - self._decreased >= self._window:
+                    self._limit = max(1.0, self._limit / 2)
+                    self._decreased = now
+            else:
+                self._limit = min(self._maximum, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Stops calling a server that keeps failing. After threshold failures in
+    a row the circuit opens and calls are refused for timeout seconds,
+    then a single call is let through to probe the server: the circuit
+    closes if it succeeds and opens again otherwise. A threshold of 0
+    never opens the circuit.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, threshold=5, timeout=30):
+        self._threshold = threshold
+        self._timeout = timeout
+        self._failures = 0
+        self._opened = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened is None:
+                return self.CLOSED
+            if self._probing or time.monotonic() - self._opened >= self._timeout:
+                return self.HALF_OPEN
+            return self.OPEN
+
+    @property
+    def retry_in(self):
+        """
+        Seconds until a call is let through again, 0 if it would be now.
+        """
+        with self._lock:
+            if self._opened is None:
+                return 0
+            return max(0, self._opened + self._timeout - time.monotonic())
+
+    def allow(self):
+        """
+        Returns whether a call may be made now, a call allowed must be
+        followed by succeeded or failed.
+        """
+        with self._lock:
+            if self._opened is None:
+                return True
+            if self._probing or time.monotonic() - self._opened < self._timeout:
+                return False
+            self._probing = True
+            return True
+
+    def succeeded(self):
+        with self._lock:
+            self._failures = 0
+            self._opened = None
+            self._probing = False
+
+    def failed(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or (
+                self._threshold and self._failures >= self._threshold
+            ):
+                self._opened = time.monotonic()
+            self._probing = False
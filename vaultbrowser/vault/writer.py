@@ -0,0 +1,249 @@
+from cdtui import ListenerHandler
+from .throttle import AdaptiveLimit, backoff, retried_by_caller
+import hvac.exceptions
+import requests.exceptions
+import logging
+import threading
+import queue
+import json
+import time
+import os
+
+# Answers meaning vault is overloaded or briefly unavailable, like a
+# standby not caught up yet
+_THROTTLING_ERRORS = tuple(
+    getattr(hvac.exceptions, name)
+    for name in [
+        "RateLimitExceeded",
+        "InternalServerError",
+        "BadGateway",
+        "VaultDown",
+        "PreconditionFailed",
+    ]
+    if hasattr(hvac.exceptions, name)
+)
+_TRANSIENT_ERRORS = _THROTTLING_ERRORS + (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+
+class Checkpoint:
+    """
+    Keeps the paths written so far in a file, one json string per line,
+    so an interrupted bulk write can be resumed skipping them.
+    """
+    def __init__(self, file_name):
+        self._done = set()
+        if os.path.isfile(file_name):
+            with open(file_name) as f:
+                for line in f:
+                    try:
+                        self._done.add(json.loads(line))
+                    except ValueError:
+                        # Last line may be cut short by the interruption
+                        pass
+        self._file = open(file_name, "a")
+        self._lock = threading.Lock()
+
+    def __contains__(self, path):
+        return path in self._done
+
+    def __len__(self):
+        return len(self._done)
+
+    def add(self, path):
+        line = json.dumps(path) + "\n"
+        with self._lock:
+            self._done.add(path)
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# Queued in place of a value for entries to delete
+_DELETE = object()
+
+
+class BulkWriter:
+    """
+    Writes entries through a handler with a pool of threads. Entries are
+    queued with put, which blocks while the queue is full, so producers
+    never get ahead of writers by more than queue_size entries.
+
+    At most workers writes run at once, fewer while vault answers with
+    429 or 5xx errors: concurrency is halved on each of them and grows
+    back slowly. Such failures are retried up to retries times with
+    jittered exponential backoff, which is safe because writing the same
+    value twice leaves the same result. Deletes queued with put_delete
+    go through the same workers, limit and retries.
+    """
+    def __init__(
+        self, handler, workers=8, queue_size=None, retries=5, checkpoint=None
+    ):
+        self._on_written = ListenerHandler(self)
+        self._on_deleted = ListenerHandler(self)
+        self._on_error = ListenerHandler(self)
+        self._handler = handler
+        self._workers = max(1, workers)
+        self._limit = AdaptiveLimit(self._workers)
+        self._retries = retries
+        self._checkpoint = checkpoint
+        self._queue = queue.Queue(queue_size or self._workers * 4)
+        self._threads = []
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._started = None
+        self.written = 0
+        self.deleted = 0
+        self.skipped = 0
+        self.retried = 0
+        self.errors = 0
+
+    @property
+    def on_written(self):
+        """
+        Called with the path of each entry written, from writer threads.
+        """
+        return self._on_written
+
+    @property
+    def on_deleted(self):
+        """
+        Called with the path of each entry deleted, from writer threads.
+        """
+        return self._on_deleted
+
+    @property
+    def on_error(self):
+        """
+        Called with the path and the error of each failed write,
+        from writer threads.
+        """
+        return self._on_error
+
+    @property
+    def concurrency(self):
+        """
+        Number of writes currently allowed to run at once.
+        """
+        return self._limit.limit
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self._started if self._started else 0
+        return self.written / elapsed if elapsed else 0
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def start(self):
+        self._started = time.monotonic()
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(self._workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def put(self, path, value):
+        """
+        Queues an entry, entries found in the checkpoint are skipped.
+        """
+        if self._checkpoint is not None and path in self._checkpoint:
+            with self._lock:
+                self.skipped += 1
+            return
+        self._queue.put((path, value))
+
+    def put_delete(self, path):
+        """
+        Queues the deletion of an entry, skipped if found in the checkpoint.
+        """
+        self.put(path, _DELETE)
+
+    def close(self):
+        """
+        Blocks until every queued entry is written, then stops the threads
+        and closes the checkpoint.
+        """
+        try:
+            self._queue.join()
+            for _ in self._threads:
+                self._queue.put(None)
+            for thread in self._threads:
+                thread.join()
+        finally:
+            if self._checkpoint is not None:
+                self._checkpoint.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if not self.cancelled:
+                    self._write(*item)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path, value):
+        for attempt in range(self._retries + 1):
+            if self.cancelled:
+                return
+            self._limit.acquire()
+            try:
+                # Retried here only, lowering concurrency
+                with retried_by_caller():
+                    if value is _DELETE:
+                        self._handler.delete(path)
+                    else:
+                        self._handler.write(path, value)
+            except _TRANSIENT_ERRORS as e:
+                self._limit.release(throttled=True)
+                error = e
+                if attempt < self._retries:
+                    with self._lock:
+                        self.retried += 1
+                    time.sleep(backoff(attempt))
+                continue
+            except Exception as e:
+                self._limit.release()
+                error = e
+                break
+            self._limit.release()
+            self._succeeded(path, value is _DELETE)
+            return
+        action = "delete" if value is _DELETE else "write"
+        logging.error(f"Unable to {action} {path}: {error}")
+        with self._lock:
+            self.errors += 1
+        self._on_error(path, error)
+
+    def _succeeded(self, path, deleted=False):
+        if self._checkpoint is not None:
+            self._checkpoint.add(path)
+        with self._lock:
+            if deleted:
+                self.deleted += 1
+            else:
+                self.written += 1
+        if deleted:
+            self._on_deleted(path)
+        else:
+            self._on_written(path)